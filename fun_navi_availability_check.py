@@ -1,10 +1,20 @@
-from fun_navi_common import (
-    configure_logging, initialize_driver, login, search_availability, is_weekend_or_holiday
-)
-from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
+from fun_navi_common import configure_logging, get_dates_range
+from fun_navi_backend import search_slots_or_none
+from fun_navi_engine import create_resilient_backend
+from fun_navi_pool import run_availability_pool
+from fun_navi_tabs import run_availability_tabs
+from fun_navi_metrics import MemorySampler
+from fun_navi_query_planner import Query, plan_queries, plan_savings, split_slots
+from fun_navi_store import connect_store, is_fresh, save_availability, load_matrix
+from fun_navi_checkpoint import Checkpoint, iter_checkpoint
+from fun_navi_slot_matrix import SlotMatrix
+from fun_navi_parser import SlotAvailability
+from dataclasses import asdict
+from datetime import datetime
+import argparse
 import os
 import csv
+import time
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -12,78 +22,158 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.service import Service
 
 logger = configure_logging()
-driver = initialize_driver()
+
+parser = argparse.ArgumentParser(description="指定期間・指定施設の空き状況確認")
+parser.add_argument("--resume", action="store_true", help="前回中断した検索の続きから再開する（完了済みの施設・日付は検索しない）")
+args = parser.parse_args()
 
 # 環境変数を読み込み
 FACILITY_NAMES = os.getenv("PR_FACILITY_NAMES", "").split(",")
 SEARCH_START_DATE = os.getenv("PR_SEARCH_START_DATE")
 SEARCH_END_DATE = os.getenv("PR_SEARCH_END_DATE")
-HOLIDAYS_ONLY = os.getenv("PR_HOLIDAYS_ONLY", "false").lower() == "true"
-
-# 空き状況を記録
-availability_results = {}
-
-
-def get_dates_range(start_date, end_date):
-    """
-    開始日と終了日で指定された範囲の日付リストを生成。
-    除外日と追加日を考慮する。
-    """
-    # .env から除外日と追加日を取得
-    excluded_dates = os.getenv("PR_EXCLUDED_DATES", "").split(",")
-    additional_dates = os.getenv("PR_ADDITIONAL_DATES", "").split(",")
-    
-    # 除外日と追加日を datetime オブジェクトに変換
-    excluded_dates = {datetime.strptime(date.strip(), "%Y/%m/%d") for date in excluded_dates if date.strip()}
-    additional_dates = {datetime.strptime(date.strip(), "%Y/%m/%d") for date in additional_dates if date.strip()}
-
-    current_date = start_date
-    dates = []
-
-    # 指定された期間の日付をリストに追加
-    while current_date <= end_date:
-        if HOLIDAYS_ONLY and not is_weekend_or_holiday(current_date):
-            current_date += timedelta(days=1)
-            continue
-
-        if current_date not in excluded_dates:
-            dates.append(current_date.strftime("%Y/%m/%d"))
-
-        current_date += timedelta(days=1)
-
-    # 追加日をリストに追加し、重複を排除しつつ昇順にソート
-    all_dates = {datetime.strptime(date, "%Y/%m/%d") for date in dates}
-    final_dates = sorted(all_dates.union(additional_dates) - excluded_dates)
-
-    return [date.strftime("%Y/%m/%d") for date in final_dates]
-
-
-try:
-    # ログイン
-    login(driver, logger)
-
-    # 日付範囲を取得
-    start_date = datetime.strptime(SEARCH_START_DATE, "%Y/%m/%d")
-    end_date = datetime.strptime(SEARCH_END_DATE, "%Y/%m/%d")
-    dates = get_dates_range(start_date, end_date)
-    last_facility_name = None
-    last_date = None
-
-    current_date = start_date
-    for date in dates:
-        current_date = datetime.strptime(date, "%Y/%m/%d")
-        for facility_name in FACILITY_NAMES:
-            facility_name = facility_name.strip()
-            if facility_name not in availability_results:
-                availability_results[facility_name] = {}
-
-            logger.debug(f"施設: {facility_name}, 日付: {current_date.strftime('%Y/%m/%d')} を検索中...")
-            availability = search_availability(driver, logger, facility_name, current_date )
-
-            availability_results[facility_name][current_date.strftime("%Y/%m/%d")] = "○" if availability else "×"
-
-finally:
-    driver.quit()
+MAX_WORKERS = int(os.getenv("PR_MAX_WORKERS", "1"))
+EXECUTION_MODE = os.getenv("PR_EXECUTION_MODE", "sessions").lower()
+SHARED_KEYWORDS = [keyword.strip() for keyword in os.getenv("PR_SHARED_KEYWORDS", "").split(",") if keyword.strip()]
+CHECKPOINT_FILE = os.getenv("PR_CHECKPOINT_FILE", "availability_checkpoint.jsonl")
+SLOT_EXPORT_FILE = os.getenv("PR_SLOT_EXPORT_FILE", "")
+
+
+# 日付範囲を取得
+start_date = datetime.strptime(SEARCH_START_DATE, "%Y/%m/%d")
+end_date = datetime.strptime(SEARCH_END_DATE, "%Y/%m/%d")
+dates = get_dates_range(start_date, end_date, "PR")
+facility_names = [facility_name.strip() for facility_name in FACILITY_NAMES]
+
+# 検索対象の(施設名, 日付)の組み合わせ
+tasks = [(facility_name, date) for date in dates for facility_name in facility_names]
+
+store = connect_store()
+
+
+def save_query_result(query, slots, fetched_at=None):
+    """1回の検索結果を施設ごとに保存し、保存した施設名を返す"""
+    saved = []
+    for facility_name, facility_slots in split_slots(query, slots).items():
+        if facility_slots is not None:
+            save_availability(store, facility_name, query.date, facility_slots, fetched_at)
+            saved.append(facility_name)
+        elif slots is not None:
+            logger.warning(f"施設: {facility_name}, 日付: {query.date} の結果が「{query.keyword}」の検索結果に見つかりません")
+    return saved
+
+
+def replay_checkpoint():
+    """チェックポイントの検索結果を1行ずつ読み込んで保存し、完了済みの (施設名, 日付) を返す"""
+    completed = set()
+    for record in iter_checkpoint(CHECKPOINT_FILE):
+        query = Query(record["keyword"], record["date"], record["facility_names"])
+        slots = None if record["slots"] is None else [SlotAvailability(**slot) for slot in record["slots"]]
+        fetched_at = datetime.fromisoformat(record["fetched_at"])
+        completed.update((facility_name, query.date) for facility_name in save_query_result(query, slots, fetched_at))
+    return completed
+
+
+# 中断した検索の結果を保存し、完了済みの組み合わせは検索しない
+completed = set()
+if args.resume:
+    completed = replay_checkpoint()
+    logger.info(f"{CHECKPOINT_FILE}から完了済みの{len(completed)}件を読み込みました")
+
+# 有効期間内の結果が保存済みの組み合わせは検索しない
+now = datetime.now()
+stale_tasks = [
+    (facility_name, date) for facility_name, date in tasks
+    if (facility_name, date) not in completed and not is_fresh(store, facility_name, date, now)
+]
+logger.info(f"{len(tasks)}件中{len(stale_tasks)}件を検索します（残りは保存済みの結果を使用）")
+
+# 検索回数と入力し直しが少なくなる順序で検索する
+queries = plan_queries(stale_tasks, SHARED_KEYWORDS)
+savings = plan_savings(stale_tasks, queries)
+if stale_tasks:
+    logger.info(f"検索回数: {savings['baseline']['searches']} → {savings['planned']['searches']}"
+                f"（{savings['searches_saved']}回削減）, 入力文字数: {savings['baseline']['keystrokes']}"
+                f" → {savings['planned']['keystrokes']}（{savings['keystrokes_saved']}文字削減）")
+query_tasks = [(query.keyword, query.date) for query in queries]
+queries_by_task = {(query.keyword, query.date): query for query in queries}
+
+started = time.monotonic()
+with MemorySampler() as memory, Checkpoint(CHECKPOINT_FILE, resume=args.resume) as checkpoint:
+    # 検索に失敗した (キーワード, 日付)
+    failed = set()
+
+    def record_result(keyword, date, slots):
+        """検索結果が分かった時点でチェックポイントに追記する"""
+        if slots is None:
+            failed.add((keyword, date))
+        else:
+            failed.discard((keyword, date))
+        query = queries_by_task[(keyword, date)]
+        checkpoint.append({
+            "keyword": keyword,
+            "date": date,
+            "facility_names": query.facility_names,
+            "slots": None if slots is None else [asdict(slot) for slot in slots],
+            "fetched_at": datetime.now().isoformat(timespec="seconds"),
+        })
+
+    if query_tasks and MAX_WORKERS > 1:
+        if EXECUTION_MODE == "tabs":
+            # 1つのブラウザの複数タブで検索
+            logger.info(f"{MAX_WORKERS}タブで並行に検索します")
+            run_availability_tabs(logger, query_tasks, MAX_WORKERS, record_result)
+        else:
+            # 複数のセッションで並列に検索
+            logger.info(f"{MAX_WORKERS}セッションで並列に検索します")
+            run_availability_pool(logger, query_tasks, MAX_WORKERS, record_result)
+    elif query_tasks:
+        backend = create_resilient_backend(logger)
+        try:
+            # ログイン
+            backend.login()
+
+            for query in queries:
+                logger.debug(f"キーワード: {query.keyword}, 日付: {query.date} を検索中...")
+                record_result(query.keyword, query.date,
+                              search_slots_or_none(backend, logger, query.keyword, query.date))
+
+        finally:
+            backend.quit()
+
+    # 失敗した検索は「空きなし」にせず、最後に新しいセッションでもう一度検索する
+    if failed:
+        logger.info(f"検索に失敗した{len(failed)}件を再試行します")
+        retry_tasks = [task for task in query_tasks if task in failed]
+        backend = create_resilient_backend(logger)
+        try:
+            backend.login()
+            for keyword, date in retry_tasks:
+                record_result(keyword, date, search_slots_or_none(backend, logger, keyword, date))
+        finally:
+            backend.quit()
+        if failed:
+            logger.warning(f"{len(failed)}件は検索できませんでした（--resume で再実行できます）")
+
+# スループットとメモリ使用量（実行モードの比較用）
+elapsed = time.monotonic() - started
+if query_tasks:
+    mode = EXECUTION_MODE if MAX_WORKERS > 1 else "sequential"
+    logger.info(f"実行モード: {mode}（並列数 {MAX_WORKERS}）, {len(query_tasks)}件を{elapsed:.1f}秒で検索"
+                f"（{len(query_tasks) / elapsed:.2f}件/秒）, 最大メモリ使用量: {memory.peak_mb:.0f}MB")
+
+# チェックポイントの検索結果を保存し、保存済みの結果から空き状況を作成
+replay_checkpoint()
+availability_results = load_matrix(store, facility_names, dates)
+slot_matrix = SlotMatrix.from_store(store, facility_names)
+store.close()
+
+# 時間帯ごとの空き状況を列指向形式（Parquet）で出力
+if SLOT_EXPORT_FILE:
+    try:
+        slot_matrix.to_parquet(SLOT_EXPORT_FILE)
+        logger.info(f"時間帯ごとの空き状況を{SLOT_EXPORT_FILE}に出力しました")
+    except ImportError:
+        logger.warning("pyarrowがインストールされていないため、時間帯ごとの空き状況の出力を省略します")
 
 # CSVに出力
 with open("availability_results.csv", "w", encoding="utf-8", newline="") as file:
@@ -101,7 +191,8 @@ with open("availability_results.csv", "w", encoding="utf-8", newline="") as file
         
         # 各施設の行を書き込む
         for facility_name, dates_availability in availability_results.items():
-            row = [facility_name] + [dates_availability.get(date, "×") for date in all_dates]
+            # 検索できなかった日付は「空きなし」と区別して ? にする
+            row = [facility_name] + [dates_availability.get(date, "?") for date in all_dates]
             writer.writerow(row)    
 
     logger.info("空き状況をavailability_matrix.csvに出力しました")
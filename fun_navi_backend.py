@@ -0,0 +1,130 @@
+from fun_navi_common import (
+    initialize_driver, login, navigate_to_page, search_availability, search_availability_slots,
+    fetch_reservations, with_relogin
+)
+from fun_navi_client import connect_daemon
+from datetime import datetime
+import os
+
+
+def _navigate_and_fetch_reservations(driver, logger, now=None, known=None):
+    # 予約履歴ページに移動
+    navigate_to_page(driver, logger, '//a[contains(@href, "do_ReserveInfoListGeneral")]')
+    return fetch_reservations(driver, logger, now, known)
+
+
+class SeleniumBackend:
+    """Chrome（Selenium）を使う従来のバックエンド"""
+    name = "selenium"
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.driver = initialize_driver()
+
+    def login(self):
+        login(self.driver, self.logger)
+
+    def search_availability(self, facility_name, date):
+        return with_relogin(self.driver, self.logger, search_availability, facility_name, date)
+
+    def search_slots(self, facility_name, date):
+        return with_relogin(self.driver, self.logger, search_availability_slots, facility_name, date)
+
+    def fetch_reservations(self, now=None, known=None):
+        return with_relogin(self.driver, self.logger, _navigate_and_fetch_reservations, now, known)
+
+    def quit(self):
+        self.driver.quit()
+
+
+class FallbackBackend:
+    """HTTPバックエンドで処理できないページに当たった場合、以降はSeleniumで処理する"""
+
+    def __init__(self, logger, primary):
+        self.logger = logger
+        self.active = primary
+
+    @property
+    def name(self):
+        return self.active.name
+
+    def _fallback(self, error):
+        self.logger.warning(f"{self.active.name}バックエンドで処理できないため、Seleniumに切り替えます: {error}")
+        self.active.quit()
+        self.active = SeleniumBackend(self.logger)
+        self.active.login()
+
+    def _call(self, method, *args):
+        # requestsが必要なHTTPバックエンドは使用時のみimport
+        from fun_navi_http import HttpBackendError
+        try:
+            return getattr(self.active, method)(*args)
+        except HttpBackendError as e:
+            if isinstance(self.active, SeleniumBackend):
+                raise
+            self._fallback(e)
+            return getattr(self.active, method)(*args)
+
+    def login(self):
+        self._call("login")
+
+    def search_availability(self, facility_name, date):
+        return self._call("search_availability", facility_name, date)
+
+    def search_slots(self, facility_name, date):
+        return self._call("search_slots", facility_name, date)
+
+    def fetch_reservations(self, now=None, known=None):
+        return self._call("fetch_reservations", now, known)
+
+    def quit(self):
+        self.active.quit()
+
+
+def create_backend(logger, use_daemon=True):
+    """
+    環境変数 FUN_NAVI_BACKEND（selenium / http）に応じたバックエンドを作成。
+    常駐サービス（fun_navi_daemon.py）に接続できる場合は、ブラウザを起動せずにそちらを使う。
+    """
+    if use_daemon:
+        client = connect_daemon(logger)
+        if client is not None:
+            return client
+
+    backend_name = os.getenv("FUN_NAVI_BACKEND", "selenium").lower()
+    if backend_name == "http":
+        from fun_navi_http import HttpBackend
+        return FallbackBackend(logger, HttpBackend(logger))
+    if backend_name != "selenium":
+        logger.warning(f"不明なバックエンド {backend_name} が指定されたため、seleniumを使用します")
+    return SeleniumBackend(logger)
+
+
+def search_slots_or_none(backend, logger, facility_name, date):
+    """
+    時間帯ごとの空き状況を検索する。
+    エラーの場合は「空きなし」と区別できるよう None を返す。
+    """
+    if isinstance(date, str):
+        date = datetime.strptime(date, "%Y/%m/%d")
+    try:
+        slots = backend.search_slots(facility_name, date)
+    except Exception as e:
+        logger.error(f"施設: {facility_name}, 日付: {date.strftime('%Y/%m/%d')} の検索中にエラーが発生: {str(e)}",
+                     extra={"facility": facility_name, "date": date.strftime("%Y/%m/%d"), "stage": "search",
+                            "outcome": "error", "error_type": type(e).__name__})
+        return None
+
+    log_search_result(logger, facility_name, date, slots)
+    return slots
+
+
+def log_search_result(logger, facility_name, date, slots):
+    if isinstance(date, str):
+        date = datetime.strptime(date, "%Y/%m/%d")
+    fields = {"facility": facility_name, "date": date.strftime("%Y/%m/%d"), "stage": "search",
+              "available_slots": sum(slot.available for slot in slots)}
+    if any(slot.available for slot in slots):
+        logger.info(f"施設: {facility_name}, 日付: {date.strftime('%Y/%m/%d')} は予約可能", extra=dict(fields, outcome="available"))
+    else:
+        logger.info(f"施設: {facility_name}, 日付: {date.strftime('%Y/%m/%d')} は空きなし", extra=dict(fields, outcome="unavailable"))
@@ -1,6 +1,11 @@
 from fun_navi_common import (
-    configure_logging, initialize_driver, login, apply_for_facility_lottery, is_weekend_or_holiday
+    configure_logging, initialize_driver, login, apply_for_facility_lottery, with_relogin,
+    get_dates_range, get_lottery_period, COMPLETED_LOTTERY_STATUSES
 )
+from fun_navi_tabs import run_lottery_tabs, TAB_ARGUMENTS
+from fun_navi_client import connect_daemon
+from fun_navi_checkpoint import Checkpoint, iter_checkpoint
+import argparse
 import os
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -8,58 +13,37 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.service import Service
 from dotenv import load_dotenv
-import holidays
-from datetime import datetime, timedelta
+from datetime import datetime
 from dateutil.relativedelta import relativedelta  # dateutilライブラリを使用
 import csv
 
 
 logger = configure_logging()
-driver = initialize_driver()
+
+parser = argparse.ArgumentParser(description="抽選申し込み")
+parser.add_argument("--resume", action="store_true", help="前回中断した申し込みの続きから再開する（申し込み済みの施設・日付は飛ばす）")
+args = parser.parse_args()
 
 # 環境変数を読み込み
 FACILITY_NAMES = os.getenv("PRR_FACILITY_NAMES", "").split(",")
-HOLIDAYS_ONLY = os.getenv("PRR_HOLIDAYS_ONLY", "false").lower() == "true"
-
-# 空き状況を記録
-# availability_results = {}
-
-# 予約履歴を記録
-reservation_results = []
-
-def get_dates_range(start_date, end_date):
-    """
-    開始日と終了日で指定された範囲の日付リストを生成。
-    除外日と追加日を考慮する。
-    """
-    # .env から除外日と追加日を取得
-    excluded_dates = os.getenv("PRR_EXCLUDED_DATES", "").split(",")
-    additional_dates = os.getenv("PRR_ADDITIONAL_DATES", "").split(",")
-    
-    # 除外日と追加日を datetime オブジェクトに変換
-    excluded_dates = {datetime.strptime(date.strip(), "%Y/%m/%d") for date in excluded_dates if date.strip()}
-    additional_dates = {datetime.strptime(date.strip(), "%Y/%m/%d") for date in additional_dates if date.strip()}
-
-    current_date = start_date
-    dates = []
-
-    # 指定された期間の日付をリストに追加
-    while current_date <= end_date:
-        if HOLIDAYS_ONLY and not is_weekend_or_holiday(current_date):
-            current_date += timedelta(days=1)
-            continue
+TABS = int(os.getenv("PRR_TABS", "1"))
+CHECKPOINT_FILE = os.getenv("PRR_CHECKPOINT_FILE", "reservation_checkpoint.jsonl")
 
-        if current_date not in excluded_dates:
-            dates.append(current_date.strftime("%Y/%m/%d"))
+# 中断した申し込みのうち、完了した (施設名, 日付)（失敗・抽選対象の時間帯なしは再度申し込む）
+completed = set()
+if args.resume:
+    completed = {
+        (record["facility_name"], record["date"]) for record in iter_checkpoint(CHECKPOINT_FILE)
+        if record["status"] in COMPLETED_LOTTERY_STATUSES
+    }
+    logger.info(f"{CHECKPOINT_FILE}から完了済みの{len(completed)}件を読み込みました")
 
-        current_date += timedelta(days=1)
-
-    # 追加日をリストに追加し、重複を排除しつつ昇順にソート
-    all_dates = {datetime.strptime(date, "%Y/%m/%d") for date in dates}
-    final_dates = sorted(all_dates.union(additional_dates) - excluded_dates)
-
-    return [date.strftime("%Y/%m/%d") for date in final_dates]
+# 常駐サービスに接続できる場合は、ブラウザを起動せずにそちらで申し込む
+daemon = connect_daemon(logger)
+driver = None if daemon else initialize_driver(TAB_ARGUMENTS if TABS > 1 else None)
 
+# 申し込み結果を1件ごとに記録
+checkpoint = Checkpoint(CHECKPOINT_FILE, resume=args.resume)
 
 try:
     # 施設名が空の場合にエラーを発生
@@ -67,7 +51,8 @@ try:
         raise ValueError("FACILITY_NAMESが空です。環境変数に少なくとも1つの施設名を指定してください。")
 
     # ログイン
-    login(driver, logger)
+    if driver:
+        login(driver, logger)
 
     # 現在の日付と時刻を取得
     now = datetime.now()
@@ -78,40 +63,55 @@ try:
     month_two_months_later = two_months_later.month
 
 
-    print(f"現在の年月: {now.year}年{now.month}月")
-    print(f"2か月後の年月: {year_two_months_later}年{month_two_months_later}月")
+    logger.info(f"現在の年月: {now.year}年{now.month}月")
+    logger.info(f"2か月後の年月: {year_two_months_later}年{month_two_months_later}月")
 
     # 指定した月の最初の日と最後の日
-    start_date = datetime(year_two_months_later, month_two_months_later, 1)
-    if month_two_months_later == 12:
-        end_date = datetime(year_two_months_later + 1, 1, 1) - timedelta(days=1)
-    else:
-        end_date = datetime(year_two_months_later, month_two_months_later + 1, 1) - timedelta(days=1)
+    start_date, end_date = get_lottery_period(now)
 
-    dates = get_dates_range(start_date, end_date)
-    last_facility_name = None
-    last_date = None
+    dates = get_dates_range(start_date, end_date, "PRR")
 
-    current_date = start_date
-    for date in dates:
-        current_date = datetime.strptime(date, "%Y/%m/%d")
-        print(f"予約日: {current_date} の予約を試みます")
-        for facility_name in FACILITY_NAMES:
-            print(f"施設: {facility_name} の予約を試みます")
-            facility_name = facility_name.strip()
+    if TABS > 1 and driver:
+        # 1つのブラウザの複数タブで、応答待ちの間に他の申し込みを進める
+        tasks = [(facility_name.strip(), date) for date in dates for facility_name in FACILITY_NAMES
+                 if (facility_name.strip(), date) not in completed]
+        logger.info(f"{TABS}タブで並行に申し込みます")
+        run_lottery_tabs(driver, logger, tasks, TABS, checkpoint.append)
 
-            reservation_data = apply_for_facility_lottery(driver, logger, facility_name, date)
-            # 予約結果を記録
-            reservation_results.append(reservation_data)
+    else:
+        current_date = start_date
+        for date in dates:
+            current_date = datetime.strptime(date, "%Y/%m/%d")
+            logger.info(f"予約日: {current_date} の予約を試みます", extra={"date": date, "stage": "lottery"})
+            for facility_name in FACILITY_NAMES:
+                logger.info(f"施設: {facility_name} の予約を試みます", extra={"facility": facility_name.strip(), "date": date, "stage": "lottery"})
+                facility_name = facility_name.strip()
+                if (facility_name, date) in completed:
+                    logger.info(f"施設: {facility_name} は前回申し込み済みのため飛ばします",
+                                extra={"facility": facility_name, "date": date, "stage": "lottery", "outcome": "skipped"})
+                    continue
+
+                if daemon:
+                    reservation_data = daemon.apply(facility_name, date)
+                else:
+                    reservation_data = with_relogin(driver, logger, apply_for_facility_lottery, facility_name, date)
+                # 予約結果を記録
+                checkpoint.append(reservation_data)
 
 finally:
     # ブラウザを閉じる
-    driver.quit()
-
-    # CSVに結果を出力
+    if driver:
+        driver.quit()
+    checkpoint.close()
+
+    # 記録した申し込み結果を1行ずつ読み込んでCSVに出力（同じ施設・日付は後の結果を使う）
+    latest = {}
+    for record in iter_checkpoint(CHECKPOINT_FILE):
+        latest[(record["facility_name"], record["date"])] = record
     with open("reservation_results.csv", mode="w", encoding="utf-8", newline="") as file:
-        writer = csv.DictWriter(file, fieldnames=["facility_name", "date", "reservation_number", "status"])
+        writer = csv.DictWriter(file, fieldnames=["facility_name", "date", "reservation_number", "status"],
+                                extrasaction="ignore")
         writer.writeheader()
-        writer.writerows(reservation_results)
+        writer.writerows(latest.values())
 
-    print("予約結果をreservation_results.csvに出力しました。")
+    logger.info("予約結果をreservation_results.csvに出力しました。")
@@ -0,0 +1,197 @@
+"""
+テスト用サーバー（fun_navi_fake_server.py）に対して、ログイン・空き状況検索・抽選申し込み・予約履歴取得を
+繰り返し実行し、操作ごとのスループット・レイテンシ（p50/p95）・最大メモリ使用量を計測する。
+
+    python3 fun_navi_benchmark.py --backends http,selenium --browser-profiles default,performance --iterations 20 --json benchmark.json
+"""
+from fun_navi_common import configure_logging, initialize_driver, apply_for_facility_lottery, COMPLETED_LOTTERY_STATUSES
+from fun_navi_fake_server import FakeFunNaviConfig, start_fake_server
+from fun_navi_metrics import MemorySampler
+from dateutil.relativedelta import relativedelta
+from datetime import datetime, timedelta
+import argparse
+import json
+import os
+import statistics
+import time
+
+logger = configure_logging()
+
+
+def percentile(values, ratio):
+    """最近傍法によるパーセンタイル"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(ratio * len(ordered)) - 1))]
+
+
+def summarize(backend_name, operation, durations, errors, peak_mb):
+    total = sum(durations)
+    return {
+        "backend": backend_name,
+        "operation": operation,
+        "count": len(durations),
+        "errors": errors,
+        "qps": len(durations) / total if total else 0.0,
+        "mean_ms": statistics.mean(durations) * 1000 if durations else 0.0,
+        "p50_ms": percentile(durations, 0.5) * 1000 if durations else 0.0,
+        "p95_ms": percentile(durations, 0.95) * 1000 if durations else 0.0,
+        "peak_mb": peak_mb,
+    }
+
+
+def measure(func, iterations, prepare=None):
+    """
+    func(i) を iterations 回実行し、成功した回の所要時間（秒）とエラー数を返す。
+    prepare（ページの移動など）は計測の対象外として毎回 func の前に実行する。
+    func が完了以外のステータス（"Failed: ..." など）を返した場合もエラーとする。
+    """
+    durations = []
+    errors = 0
+    for i in range(iterations):
+        try:
+            if prepare is not None:
+                prepare()
+            started = time.perf_counter()
+            result = func(i)
+            duration = time.perf_counter() - started
+            if isinstance(result, dict) and result.get("status") not in COMPLETED_LOTTERY_STATUSES:
+                raise RuntimeError(result.get("status"))
+        except Exception as e:
+            errors += 1
+            logger.error(f"計測中にエラーが発生: {e}")
+            continue
+        durations.append(duration)
+    return durations, errors
+
+
+def create_benchmark_backend(backend_name):
+    if backend_name == "http":
+        # requestsが必要なHTTPバックエンドは使用時のみimport
+        from fun_navi_http import HttpBackend
+        return HttpBackend(logger)
+    from fun_navi_backend import SeleniumBackend
+    return SeleniumBackend(logger)
+
+
+def run_backend(backend_name, iterations, facility_names, label=None):
+    """1つのバックエンドで各操作を計測し、操作ごとの集計結果のリストを返す"""
+    label = label or backend_name
+    search_dates = [datetime.now() + timedelta(days=1 + i % 28) for i in range(iterations)]
+    lottery_date = (datetime.now() + relativedelta(months=2)).replace(day=1)
+    rows = []
+
+    with MemorySampler() as memory:
+        # 起動とログイン（毎回新しいセッションで計測）
+        startup_durations, login_durations, login_errors = [], [], 0
+        for _ in range(iterations):
+            started = time.perf_counter()
+            backend = create_benchmark_backend(backend_name)
+            startup_durations.append(time.perf_counter() - started)
+            try:
+                durations, errors = measure(lambda i: backend.login(), 1)
+                login_durations += durations
+                login_errors += errors
+            finally:
+                backend.quit()
+
+        backend = create_benchmark_backend(backend_name)
+        try:
+            backend.login()
+            # Seleniumは予約履歴・申し込み後のページに留まるため、毎回ログイン後の検索ページに戻してから計測する
+            # （HTTPバックエンドは検索ページを保持しているため不要）
+            back_to_search = None
+            if backend_name == "selenium":
+                search_url = backend.driver.current_url
+                back_to_search = lambda: backend.driver.get(search_url)
+            search_durations, search_errors = measure(
+                lambda i: backend.search_slots(facility_names[i % len(facility_names)], search_dates[i]), iterations)
+            fetch_durations, fetch_errors = measure(lambda i: backend.fetch_reservations(), iterations, back_to_search)
+            if backend_name == "selenium":
+                # 抽選申し込みはSeleniumのみ対応
+                apply_durations, apply_errors = measure(
+                    lambda i: apply_for_facility_lottery(
+                        backend.driver, logger, facility_names[i % len(facility_names)],
+                        lottery_date + timedelta(days=i % 28),
+                    ),
+                    iterations,
+                    back_to_search,
+                )
+        finally:
+            backend.quit()
+
+    rows.append(summarize(label, "startup", startup_durations, 0, memory.peak_mb))
+    rows.append(summarize(label, "login", login_durations, login_errors, memory.peak_mb))
+    rows.append(summarize(label, "search", search_durations, search_errors, memory.peak_mb))
+    if backend_name == "selenium":
+        rows.append(summarize(label, "apply", apply_durations, apply_errors, memory.peak_mb))
+    rows.append(summarize(label, "fetch_reservations", fetch_durations, fetch_errors, memory.peak_mb))
+    return rows
+
+
+def format_table(rows):
+    header = f"{'backend':<22}{'operation':<20}{'count':>6}{'errors':>7}{'qps':>9}{'p50(ms)':>10}{'p95(ms)':>10}{'peak(MB)':>10}"
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        lines.append(
+            f"{row['backend']:<22}{row['operation']:<20}{row['count']:>6}{row['errors']:>7}"
+            f"{row['qps']:>9.2f}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['peak_mb']:>10.0f}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="テスト用サーバーを使ったベンチマーク")
+    parser.add_argument("--backends", default="http", help="計測するバックエンド（カンマ区切り: http,selenium）")
+    parser.add_argument("--browser-profiles", default="default",
+                        help="seleniumバックエンドで比較するBROWSER_PROFILE（カンマ区切り: default,performance）")
+    parser.add_argument("--iterations", type=int, default=10, help="操作ごとの実行回数")
+    parser.add_argument("--latency-ms", type=float, default=0, help="テスト用サーバーの応答遅延（ミリ秒）")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="テスト用サーバーの応答遅延のばらつき（ミリ秒）")
+    parser.add_argument("--reservation-pages", type=int, default=3, help="予約履歴のページ数")
+    parser.add_argument("--json", help="結果をJSONで出力するファイル")
+    args = parser.parse_args()
+
+    config = FakeFunNaviConfig(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                               reservation_pages=args.reservation_pages)
+    server, login_url = start_fake_server(config)
+
+    # .env の設定より優先してテスト用サーバーを使う（保存済みのセッションは使わない）
+    os.environ.update({
+        "LOGIN_URL": login_url,
+        "USER_ID": "benchmark",
+        "PASSWORD": "benchmark",
+        "PHONE_NUMBER": "09000000000",
+        "SESSION_CACHE": "false",
+    })
+    os.environ.pop("SESSION_CHECK_URL", None)
+
+    rows = []
+    try:
+        for backend_name in [name.strip() for name in args.backends.split(",") if name.strip()]:
+            if backend_name != "selenium":
+                logger.info(f"{backend_name}バックエンドを計測中...")
+                rows += run_backend(backend_name, args.iterations, config.facilities)
+                continue
+            try:
+                initialize_driver().quit()
+            except Exception as e:
+                logger.warning(f"Chromeを起動できないため、Seleniumの計測を省略します: {e}")
+                continue
+            # Chromeの起動設定ごとに計測
+            for profile in [name.strip() for name in args.browser_profiles.split(",") if name.strip()]:
+                os.environ["BROWSER_PROFILE"] = profile
+                logger.info(f"{backend_name}バックエンド（BROWSER_PROFILE={profile}）を計測中...")
+                rows += run_backend(backend_name, args.iterations, config.facilities, f"{backend_name}:{profile}")
+    finally:
+        server.shutdown()
+
+    logger.info("計測結果\n" + format_table(rows))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump({"latency_ms": args.latency_ms, "iterations": args.iterations, "results": rows},
+                      file, ensure_ascii=False, indent=2)
+        logger.info(f"計測結果を{args.json}に出力しました")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+処理結果の記録（チェックポイント）。
+1件の結果が分かるたびにJSON 1行をファイルに追記してディスクに書き込み（fsync）、
+途中で異常終了しても、--resume で完了済みの分を飛ばして再開できるようにする。
+"""
+import json
+import logging
+import os
+import threading
+
+
+def iter_checkpoint(path):
+    """記録を1行ずつ読み込む（書き込み途中で終了した最後の行は読み飛ばす）"""
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as file:
+        for line_no, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logging.warning(f"{path}の{line_no}行目を読み込めないため読み飛ばします")
+
+
+class Checkpoint:
+    """
+    結果を1行ずつ追記するファイル。複数スレッドから同時に追記できる。
+    resume=False の場合は以前の記録を消して新しく始める。
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self._lock = threading.Lock()
+        if resume and os.path.exists(path):
+            self._truncate_partial_line()
+        self.file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def _truncate_partial_line(self):
+        # 書き込み途中の行があれば、その続きに追記しないよう改行で区切る
+        with open(self.path, "rb+") as file:
+            file.seek(0, os.SEEK_END)
+            if file.tell() == 0:
+                return
+            file.seek(-1, os.SEEK_END)
+            if file.read(1) != b"\n":
+                file.write(b"\n")
+
+    def append(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.file.write(line)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
@@ -0,0 +1,138 @@
+"""
+常駐サービス（fun_navi_daemon.py）のクライアント。
+Seleniumを読み込まずに、ログイン済みのブラウザで空き状況検索・予約履歴取得・抽選申し込みを行う。
+
+    python3 fun_navi_client.py search "SEA／E棟1階_PARTY ROOM OCEAN_昼" 2025/03/01
+    python3 fun_navi_client.py reservations
+    python3 fun_navi_client.py apply "SEA／E棟1階_PARTY ROOM OCEAN_昼" 2025/04/05
+"""
+from fun_navi_parser import SlotAvailability
+from datetime import datetime
+import argparse
+import json
+import os
+import socket
+import sys
+
+DEFAULT_SOCKET = ".fun_navi_daemon.sock"
+
+
+class DaemonError(Exception):
+    """常駐サービスで処理に失敗した（type に元の例外名）"""
+
+    def __init__(self, message, type=None):
+        super().__init__(message)
+        self.type = type
+
+
+def daemon_socket_path():
+    return os.getenv("FUN_NAVI_DAEMON_SOCKET", DEFAULT_SOCKET)
+
+
+def send_request(request, path=None, timeout=None):
+    """1行のJSONを送り、1行のJSONの応答を返す"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path or daemon_socket_path())
+        with sock.makefile("rwb") as stream:
+            stream.write(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+            stream.flush()
+            line = stream.readline()
+    if not line:
+        raise DaemonError("常駐サービスから応答がありません")
+    response = json.loads(line)
+    if not response.get("ok"):
+        raise DaemonError(response.get("error", ""), response.get("type"))
+    return response.get("result")
+
+
+def daemon_available(path=None):
+    """FUN_NAVI_DAEMON_SOCKET の常駐サービスに接続できるか"""
+    path = path or daemon_socket_path()
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(path):
+        return False
+    try:
+        return send_request({"op": "ping"}, path, timeout=1) == "pong"
+    except (OSError, ValueError, DaemonError):
+        return False
+
+
+class DaemonClient:
+    """
+    常駐サービスを、他のバックエンドと同じメソッドで使うためのクライアント。
+    ログイン・終了は常駐サービス側で管理するため、login() と quit() は何もしない。
+    """
+    name = "daemon"
+
+    def __init__(self, logger, path=None, timeout=None):
+        self.logger = logger
+        self.path = path or daemon_socket_path()
+        self.timeout = timeout if timeout is not None else float(os.getenv("FUN_NAVI_DAEMON_TIMEOUT", "300"))
+
+    def _call(self, op, **params):
+        return send_request(dict(params, op=op), self.path, self.timeout)
+
+    def login(self):
+        pass
+
+    def search_slots(self, facility_name, date):
+        if isinstance(date, datetime):
+            date = date.strftime("%Y/%m/%d")
+        return [SlotAvailability(**slot) for slot in self._call("search", facility_name=facility_name, date=date)]
+
+    def search_availability(self, facility_name, date):
+        return any(slot.available for slot in self.search_slots(facility_name, date))
+
+    def fetch_reservations(self, now=None, known=None):
+        return self._call("reservations", now=now.isoformat() if now else None, known=known)
+
+    def apply(self, facility_name, date):
+        if isinstance(date, datetime):
+            date = date.strftime("%Y/%m/%d")
+        return self._call("apply", facility_name=facility_name, date=date)
+
+    def status(self):
+        return self._call("status")
+
+    def quit(self):
+        pass
+
+
+def connect_daemon(logger):
+    """常駐サービスに接続できる場合はクライアントを、できない場合は None を返す"""
+    if not daemon_available():
+        return None
+    logger.info(f"常駐サービス（{daemon_socket_path()}）を使用します")
+    return DaemonClient(logger)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="fun navi常駐サービスのクライアント")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    search_parser = subparsers.add_parser("search", help="空き状況を検索")
+    search_parser.add_argument("facility_name")
+    search_parser.add_argument("date", help="YYYY/MM/DD")
+    subparsers.add_parser("reservations", help="先日付の予約を取得")
+    apply_parser = subparsers.add_parser("apply", help="抽選申し込み")
+    apply_parser.add_argument("facility_name")
+    apply_parser.add_argument("date", help="YYYY/MM/DD")
+    subparsers.add_parser("status", help="常駐サービスの状態")
+    subparsers.add_parser("shutdown", help="常駐サービスを終了")
+    args = parser.parse_args()
+
+    # FUN_NAVI_DAEMON_SOCKET を .env で指定している場合に備えて読み込む
+    from dotenv import load_dotenv
+    load_dotenv(override=True)
+    from fun_navi_logging import configure_logging
+    logger = configure_logging()
+
+    try:
+        if args.command in ("search", "apply"):
+            result = send_request({"op": args.command, "facility_name": args.facility_name, "date": args.date})
+        else:
+            result = send_request({"op": args.command})
+    except (OSError, DaemonError) as e:
+        logger.error(f"常駐サービスでの処理に失敗しました: {e}", extra={"stage": args.command, "outcome": "error"})
+        sys.exit(1)
+    # 処理結果はログ（標準エラー出力）ではなく標準出力に出力する
+    print(json.dumps(result, ensure_ascii=False, indent=2))
@@ -1,46 +1,62 @@
 import os
-import logging
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.service import Service
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from datetime import datetime
+from datetime import datetime, timedelta
+from contextlib import contextmanager
+from dateutil.relativedelta import relativedelta
 from dotenv import load_dotenv
-import holidays
+from fun_navi_parser import (
+    parse_datetime_with_weekday, parse_html, extract_slots, extract_reservations, upcoming_reservations,
+    is_page_synced
+)
+from fun_navi_session import (
+    SessionExpiredError, load_session, save_session, clear_session, get_session_check_url
+)
+from fun_navi_browser import apply_browser_profile, setup_browser, reserve_profile_dir, browser_profile
+from fun_navi_trace import span
+from fun_navi_wait import wait_for, wait_for_any
+from fun_navi_fixtures import record_page
+from fun_navi_logging import configure_logging
+# 日付の計算は fun_navi_dates にまとめ、各スクリプトからは従来どおりここから import できるようにする
+from fun_navi_dates import is_weekend_or_holiday, get_dates_range
+from weakref import WeakKeyDictionary
+import threading
+import time
 import getpass
 
-last_date = None
-last_facility_name  = None
+# WebDriver（セッション）ごとの検索フォーム入力状態
+_form_states = WeakKeyDictionary()
+_form_states_lock = threading.Lock()
 
 # 環境変数の読み込み
 load_dotenv(override=True)
 
-# ログレベルの設定
-def configure_logging():
-    log_level = os.getenv("LOG_LEVEL", "INFO").upper()
-    logging.basicConfig(
-        level=getattr(logging, log_level, logging.INFO),
-        format="%(asctime)s - %(levelname)s - %(message)s",
-        handlers=[
-            logging.FileHandler("fun_navi_log.log"),
-            logging.StreamHandler()
-        ]
-    )
-    return logging.getLogger(__name__)
-
 
 # WebDriver の初期化
-def initialize_driver():
+def initialize_driver(extra_arguments=None):
     chrome_driver_path = os.getenv("CHROME_DRIVER_PATH")
     options = webdriver.ChromeOptions()
-    return webdriver.Chrome(service=Service(chrome_driver_path), options=options)
+    for argument in extra_arguments or []:
+        options.add_argument(argument)
+    # BROWSER_PROFILE に応じた起動設定（headless・画像なし など）
+    apply_browser_profile(options)
+    with span("driver_start", profile=browser_profile()), reserve_profile_dir() as profile_dir:
+        if profile_dir:
+            options.add_argument(f"--user-data-dir={profile_dir}")
+        driver = webdriver.Chrome(service=Service(chrome_driver_path), options=options)
+        try:
+            setup_browser(driver)
+        except Exception:
+            driver.quit()
+            raise
+    return driver
 
 
-# ログイン処理
-def login(driver, logger):
-    login_url = os.getenv("LOGIN_URL", "https://fun-navi.net/frpc010g.jsp")
+# 認証情報の取得（未設定の場合は入力を求める）
+def get_credentials():
     user_id = os.getenv("USER_ID")
     password = os.getenv("PASSWORD")
 
@@ -48,198 +64,454 @@ def login(driver, logger):
         user_id = input("fun naviのユーザーIDを入力してください: ")
     if not password:
         password = getpass.getpass("fun naviのパスワードを入力してください: ")
+    return user_id, password
+
+
+# ログイン画面に戻されたか（セッション切れ）の判定
+def is_session_expired(driver):
+    login_url = os.getenv("LOGIN_URL", "https://fun-navi.net/frpc010g.jsp")
+    try:
+        return (driver.current_url.startswith(login_url)
+                or bool(driver.find_elements(By.CSS_SELECTOR, "input[type='password']")))
+    except Exception:
+        return False
+
+
+# 保存済みのセッション（cookie）でのログイン
+def restore_session(driver, logger):
+    """保存済みのcookieを設定し、1回のページ読み込みで有効性を確認する"""
+    session = load_session(os.getenv("USER_ID"))
+    if not session:
+        return False
 
     try:
-        driver.get(login_url)
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "a11y-01")))
-        driver.find_element(By.ID, "a11y-01").send_keys(user_id)
-        driver.find_element(By.ID, "a11y-02").send_keys(password)
-        driver.find_element(By.XPATH, '//input[@type="submit" and @value="ログイン"]').click()
-        WebDriverWait(driver, 10).until(EC.url_contains("FRPC010G_LoginAction.do"))
+        # ページを開く前にcookieを設定できるよう、DevToolsで一括設定
+        cookies = []
+        for cookie in session["cookies"]:
+            cdp_cookie = {key: cookie[key] for key in ("name", "value", "domain", "path", "secure", "httpOnly") if key in cookie}
+            if "expiry" in cookie:
+                cdp_cookie["expires"] = cookie["expiry"]
+            cookies.append(cdp_cookie)
+        with span("session_restore"):
+            driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookies})
+
+            driver.get(get_session_check_url(session))
+            wait_for(driver, "session_restore", EC.any_of(
+                EC.presence_of_element_located((By.ID, "keyword")),
+                EC.presence_of_element_located((By.CSS_SELECTOR, "input[type='password']")),
+            ), 10)
+        if is_session_expired(driver):
+            raise SessionExpiredError("ログイン画面が表示されました")
+
+        logger.info("保存済みのセッションでログインしました")
+        return True
+    except Exception as e:
+        logger.info(f"保存済みのセッションが無効なため、ログインし直します: {e}")
+        clear_session(os.getenv("USER_ID"))
+        driver.delete_all_cookies()
+        return False
+
+
+# ログイン処理
+def login(driver, logger):
+    if restore_session(driver, logger):
+        return
+
+    login_url = os.getenv("LOGIN_URL", "https://fun-navi.net/frpc010g.jsp")
+    user_id, password = get_credentials()
+
+    try:
+        with span("login"):
+            driver.get(login_url)
+            wait_for(driver, "login_form", EC.presence_of_element_located((By.ID, "a11y-01")), 10)
+            driver.find_element(By.ID, "a11y-01").send_keys(user_id)
+            driver.find_element(By.ID, "a11y-02").send_keys(password)
+            driver.find_element(By.XPATH, '//input[@type="submit" and @value="ログイン"]').click()
+            wait_for(driver, "login_submit", EC.url_contains("FRPC010G_LoginAction.do"), 10)
         logger.info("ログイン成功")
     except Exception as e:
         logger.error(f"ログインに失敗しました: {e}")
         raise
 
-
-# 日付フォーマット関数
-def parse_datetime_with_weekday(date_str):
-    try:
-        date_str_cleaned = date_str.split("(")[0].strip() + " " + date_str.split(" ")[1].strip()
-        return datetime.strptime(date_str_cleaned, "%Y/%m/%d %H:%M")
-    except ValueError as e:
-        logging.error(f"日付のフォーマットエラー: {date_str} - {e}")
-        return None
+    # 次回以降のためにセッションを保存
+    save_session(os.getenv("USER_ID"), driver.get_cookies(), driver.current_url)
 
 
-# 土日祝日判定
-def is_weekend_or_holiday(date):
-    year = date.year
-    japan_holidays = holidays.Japan(years=year)
-    return date.weekday() in [5, 6] or date in japan_holidays
+# セッション切れ時の再ログインと再実行
+def with_relogin(driver, logger, func, *args, **kwargs):
+    """セッション切れを検出した場合、ログインし直して1回だけ再実行する"""
+    try:
+        return func(driver, logger, *args, **kwargs)
+    except SessionExpiredError as e:
+        logger.warning(f"セッションの有効期限が切れたため、ログインし直して再実行します: {e}")
+        clear_session(os.getenv("USER_ID"))
+        # ログインし直すと検索フォームは空になる
+        get_form_state(driver).update(new_form_state())
+        if kwargs.get("form_state") is not None:
+            kwargs["form_state"].update(new_form_state())
+        login(driver, logger)
+        return func(driver, logger, *args, **kwargs)
+
+
+# 抽選申し込み対象の期間（2ヶ月後の月初〜月末）
+def get_lottery_period(now):
+    two_months_later = now + relativedelta(months=2)
+    start_date = datetime(two_months_later.year, two_months_later.month, 1)
+    end_date = start_date + relativedelta(months=1) - timedelta(days=1)
+    return start_date, end_date
 
 
 # ページ遷移の共通関数
 def navigate_to_page(driver, logger, xpath):
     try:
-        WebDriverWait(driver, 10).until(
-            EC.invisibility_of_element_located((By.ID, "loading"))
-        )
-        button = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.XPATH, xpath)))
+        with span("loading_wait"):
+            wait_for(driver, "navigate_loading", EC.invisibility_of_element_located((By.ID, "loading")), 10)
+        with span("navigate", xpath=xpath):
+            button = wait_for(driver, "navigate_link", EC.element_to_be_clickable((By.XPATH, xpath)), 10)
 
-        button.click()
+            button.click()
         logger.info("ページ遷移に成功しました。")
         
     except Exception as e:
         logger.error(f"ページ遷移に失敗しました: {e}")
         raise
 
-# 空き状況チェックの共通関数
-def search_availability(driver, logger, facility_name, date):
-    """指定した施設名と日付で空き状況を検索"""
-    global last_date  # グローバル変数を参照
-    global last_facility_name  # グローバル変数を参照
-    try:
-        if isinstance(date, str):
-            date = datetime.strptime(date, "%Y/%m/%d")
+# 検索フォームの入力状態を新規作成
+def new_form_state():
+    return {"last_date": None, "last_facility_name": None}
+
 
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "keyword")))
+# WebDriverごとの検索フォーム入力状態を取得（なければ作成）
+def get_form_state(driver):
+    with _form_states_lock:
+        form_state = _form_states.get(driver)
+        if form_state is None:
+            form_state = new_form_state()
+            _form_states[driver] = form_state
+        return form_state
 
+
+# 検索フォーム（施設名・日付）の入力
+def fill_search_form(driver, facility_name, date, form_state):
+    """前回の入力内容と異なる項目のみ入力し直す"""
+    with span("form_fill", facility=facility_name, date=date.strftime("%Y/%m/%d")):
         # 前回と異なる施設名の場合のみ入力
-        if facility_name != last_facility_name:
+        if facility_name != form_state["last_facility_name"]:
             driver.find_element(By.ID, "keyword").clear()
             driver.find_element(By.ID, "keyword").send_keys(facility_name)
-            last_facility_name = facility_name
+            form_state["last_facility_name"] = facility_name
 
         # 前回と異なる日付の場合のみ入力
-        if date != last_date:
+        if date != form_state["last_date"]:
             driver.find_element(By.ID, "useDateArea").clear()
             driver.find_element(By.ID, "useDateArea").send_keys(date.strftime("%Y/%m/%d"))
-            last_date = date   
+            form_state["last_date"] = date
+
+
+# WebDriverのコマンド数（chromedriverへのリクエスト数）の計測
+@contextmanager
+def count_webdriver_commands(driver):
+    """with内で発行したWebDriverコマンドの数を counter["commands"] に記録する"""
+    counter = {"commands": 0}
+    original_execute = driver.execute
+
+    def execute(driver_command, params=None):
+        counter["commands"] += 1
+        return original_execute(driver_command, params)
+
+    driver.execute = execute
+    try:
+        yield counter
+    finally:
+        del driver.execute
+
+
+# 現在のページを1回のコマンドで取得して解析
+def get_page(driver):
+    html = driver.page_source
+    root = parse_html(html)
+    # FIXTURE_RECORD_DIR が指定されている場合はページを記録（解析処理の確認用）
+    record_page(html, root)
+    return root
+
+
+# 予約履歴の取得
+def fetch_reservations(driver, logger, now=None, known=None):
+    """
+    予約履歴を読み込み、先日付の予約を返す。
+    known（{予約番号: ステータス}）を渡すと、全て取得済みか過去の予約のページで読み込みを終了する。
+    known を渡さない場合（全件取得）は、途中までの結果で削除された予約を判定しないよう、エラーをそのまま送出する。
+    """
+    if now is None:
+        now = datetime.now()
+    existing_reservations = []
+    try:
+        while True:
+            # ページ全体を1回で取得して解析（行・セルごとにWebDriverへ問い合わせない）
+            with count_webdriver_commands(driver) as counter, span("reservations_parse"):
+                reservations = extract_reservations(get_page(driver))
+            logger.debug(f"予約履歴{len(reservations)}件の取得に要したWebDriverコマンド数: {counter['commands']}")
+            if not reservations:
+                logger.info("予約履歴が見つかりませんでした。")
+                break
+
+            existing_reservations.extend(upcoming_reservations(reservations, now))
+
+            if known is not None and is_page_synced(reservations, known, now):
+                logger.info("以降の予約履歴は取得済みのため、読み込みを終了します。")
+                break
+
+            next_page_buttons = driver.find_elements(By.XPATH, '//a[contains(@href, "do_NextPage")]')
+            if not next_page_buttons:
+                logger.info("全ての予約履歴を読み込みました。")
+                break
+            with span("reservations_next_page"):
+                next_page_buttons[0].click()
+                logger.info("次のページへ遷移します...")
+                wait_for(driver, "reservations_next_page", EC.presence_of_element_located(
+                    (By.CLASS_NAME, "section.view-list.first-child.last-child")), 10)
+
+    except Exception as e:
+        if is_session_expired(driver):
+            raise SessionExpiredError(str(e)) from e
+        logger.error(f"予約履歴の取得中にエラーが発生しました: {e}")
+        if known is None:
+            raise
+
+    return existing_reservations
+
+
+# ステップ（ジェネレータ）を最後まで実行
+def run_steps(steps):
+    """
+    サーバーへのリクエスト直後に yield するジェネレータを最後まで実行し、戻り値を返す。
+    複数タブでの実行時は、yield の間に他のタブの処理を進める。
+    """
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
 
-        driver.find_element(By.ID, "search").click()
+
+# 時間帯ごとの空き状況の検索（ステップ）
+def search_steps(driver, facility_name, date, form_state):
+    if isinstance(date, str):
+        date = datetime.strptime(date, "%Y/%m/%d")
+
+    # タブの切り替え（yield）をまたがないよう、段階ごとに計測する
+    attributes = {"facility": facility_name, "date": date.strftime("%Y/%m/%d")}
+    try:
+        with span("form_wait", **attributes):
+            wait_for(driver, "search_form", EC.presence_of_element_located((By.ID, "keyword")), 10)
+
+        fill_search_form(driver, facility_name, date, form_state)
+
+        with span("search_click", **attributes):
+            driver.find_element(By.ID, "search").click()
+        yield
 
         # ローディングが非表示になるまで待機
-        WebDriverWait(driver, 10).until(
-            EC.invisibility_of_element_located((By.ID, "loading"))
-        )
+        with span("loading_wait", **attributes):
+            wait_for(driver, "search_loading", EC.invisibility_of_element_located((By.ID, "loading")), 10)
         # 検索結果の確認
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CLASS_NAME, "status-area47")))
+        with span("result_wait", **attributes):
+            wait_for(driver, "search_result", EC.presence_of_element_located((By.CLASS_NAME, "status-area47")), 10)
+
+        # 結果ページを1回で取得して、時間帯ごとの空き状況を取り出す
+        with span("result_parse", **attributes):
+            return extract_slots(get_page(driver))
+
+    except Exception as e:
+        if is_session_expired(driver):
+            raise SessionExpiredError(str(e)) from e
+        raise
+
+
+# 時間帯ごとの空き状況の検索
+def search_availability_slots(driver, logger, facility_name, date, form_state=None):
+    """指定した施設名と日付で検索し、時間帯ごとの空き状況（SlotAvailability のリスト）を返す"""
+    if form_state is None:
+        form_state = get_form_state(driver)
+    return run_steps(search_steps(driver, facility_name, date, form_state))
+
+
+# 空き状況チェックの共通関数
+def search_availability(driver, logger, facility_name, date, form_state=None):
+    """指定した施設名と日付で空き状況を検索"""
+    try:
+        if isinstance(date, str):
+            date = datetime.strptime(date, "%Y/%m/%d")
+
+        slots = search_availability_slots(driver, logger, facility_name, date, form_state)
 
         # 空き状況の確認
-        available_buttons = driver.find_elements(By.CLASS_NAME, "time-rsv-available-btn")
-        available = len(available_buttons) > 0
+        available = any(slot.available for slot in slots)
 
-        if available_buttons:
-            logger.info(f"施設: {facility_name}, 日付: {date.strftime('%Y/%m/%d')} は予約可能")
+        fields = {"facility": facility_name, "date": date.strftime("%Y/%m/%d"), "stage": "search"}
+        if available:
+            logger.info(f"施設: {facility_name}, 日付: {date.strftime('%Y/%m/%d')} は予約可能", extra=dict(fields, outcome="available"))
         else:
-            logger.info(f"施設: {facility_name}, 日付: {date.strftime('%Y/%m/%d')} は空きなし")
+            logger.info(f"施設: {facility_name}, 日付: {date.strftime('%Y/%m/%d')} は空きなし", extra=dict(fields, outcome="unavailable"))
 
         return available
 
 
+    except SessionExpiredError:
+        raise
     except Exception as e:
-        logger.error(f"施設: {facility_name}, 日付: {date.strftime('%Y/%m/%d')} の検索中にエラーが発生: {str(e)}")
+        # 「空きなし」と区別できるよう、False にせずエラーのまま返す（再試行は fun_navi_engine で行う）
+        logger.error(f"施設: {facility_name}, 日付: {date.strftime('%Y/%m/%d')} の検索中にエラーが発生: {str(e)}",
+                     extra={"facility": facility_name, "date": date.strftime("%Y/%m/%d"), "stage": "search", "outcome": "error"})
+        raise
+
+# 申し込み済み（抽選待ち）の表示
+APPLIED_STATUS_XPATH = "//span[@class='rsv-status-text' and text()='抽選待ち']"
+# --resume で申し込み直さないステータス（抽選対象の時間帯がなかった日は、表示の途中だった可能性があるため申し込み直す）
+COMPLETED_LOTTERY_STATUSES = ("Success", "Already applied")
+
+
+def no_lottery_slot(driver):
+    """検索結果が表示され、抽選ボタンが1つもない場合に検索結果の要素を返す"""
+    areas = driver.find_elements(By.CLASS_NAME, "status-area47")
+    if not areas or driver.find_elements(By.CLASS_NAME, "time-drawing-available-btn"):
         return False
+    return areas[0]
 
-# 抽選申し込みの共通関数
-def apply_for_facility_lottery(driver, logger, facility_name, date):
-    """指定した施設名と日付で空き状況を検索"""
-    global last_date  # グローバル変数を参照
-    global last_facility_name  # グローバル変数を参照
-    """申し込み用の電話番号を取得"""
+
+# 抽選申し込み（ステップ）
+def lottery_steps(driver, logger, facility_name, date, form_state, timings):
+    # 申し込み用の電話番号を取得
     PHONE_NUMBER = os.getenv("PHONE_NUMBER")
     reservation_data = {"facility_name": facility_name, "date": date, "reservation_number": "", "status": "Success"}
 
     try:
         if isinstance(date, str):
             date = datetime.strptime(date, "%Y/%m/%d")
+        attributes = {"facility": facility_name, "date": date.strftime("%Y/%m/%d")}
 
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "keyword")))
+        with span("form_wait", **attributes):
+            wait_for(driver, "lottery_form", EC.presence_of_element_located((By.ID, "keyword")), 10)
 
-        # 前回と異なる施設名の場合のみ入力
-        if facility_name != last_facility_name:
-            driver.find_element(By.ID, "keyword").clear()
-            driver.find_element(By.ID, "keyword").send_keys(facility_name)
-            last_facility_name = facility_name
-
-        # 前回と異なる日付の場合のみ入力
-        if date != last_date:
-            driver.find_element(By.ID, "useDateArea").clear()
-            driver.find_element(By.ID, "useDateArea").send_keys(date.strftime("%Y/%m/%d"))
-            last_date = date   
+        fill_search_form(driver, facility_name, date, form_state)
 
         # 絞り込みボタンをクリック
         # ローディングが消えるまで待機
-        WebDriverWait(driver, 15).until(
-            EC.invisibility_of_element_located((By.ID, "loading"))
-        )
+        with span("loading_wait", **attributes):
+            wait_for(driver, "lottery_pre_search_loading", EC.invisibility_of_element_located((By.ID, "loading")), 15)
         # 絞り込みボタンをクリック
-        WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.ID, "search"))
-        ).click()
+        with span("search_click", **attributes):
+            wait_for(driver, "lottery_search_button", EC.element_to_be_clickable((By.ID, "search")), 10).click()
+        timings["searched_at"] = time.time()
+        yield
 
         # ローディングが非表示になるまで待機
-        WebDriverWait(driver, 10).until(
-            EC.invisibility_of_element_located((By.ID, "loading"))
-        )
+        with span("loading_wait", **attributes):
+            wait_for(driver, "lottery_search_loading", EC.invisibility_of_element_located((By.ID, "loading")), 10)
 
         try:
-            # 検索結果の確認
-            WebDriverWait(driver, 3).until(EC.presence_of_element_located((By.CLASS_NAME, "time-drawing-available-btn")))
-            button = driver.find_element(By.CLASS_NAME, "time-drawing-available-btn")
-            button.click()
-            logger.info(f"ボタンをクリックしました: {date}")
-
-            # 注意事項の同意チェック
-            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "a11y-06")))
-            checkbox = driver.find_element(By.ID, "a11y-06")
-            if not checkbox.is_selected():
-                checkbox.click()
-                print("注意事項への同意チェックボックスをチェックしました。")
-
-            # 緊急連絡先を入力
-            input_field = driver.find_element(By.ID, "a11y-01")
-            input_field.clear()
-            input_field.send_keys(PHONE_NUMBER)
-            print(f"電話番号 '{PHONE_NUMBER}' を入力しました。")
+            # 検索結果の確認（抽選ボタン・申し込み済み・抽選対象の時間帯なし のいずれかが表示されるまで待機）
+            with span("lottery_result", **attributes):
+                outcome, element = wait_for_any(driver, "lottery_result", {
+                    "drawing": EC.presence_of_element_located((By.CLASS_NAME, "time-drawing-available-btn")),
+                    "applied": EC.presence_of_element_located((By.XPATH, APPLIED_STATUS_XPATH)),
+                    "no_slot": no_lottery_slot,
+                }, 10)
+
+            if outcome == "applied":
+                logger.info(f"施設: {facility_name}, 日付: {date.strftime('%Y/%m/%d')} は既に抽選申し込み済みです。ステータス: {element.text}",
+                            extra=dict(attributes, stage="lottery_result", outcome="already_applied"))
+                reservation_data["status"] = "Already applied"
+                return reservation_data
+            if outcome == "no_slot":
+                logger.info(f"施設: {facility_name}, 日付: {date.strftime('%Y/%m/%d')} は抽選申し込みできる時間帯がありません。",
+                            extra=dict(attributes, stage="lottery_result", outcome="no_slot"))
+                reservation_data["status"] = "No lottery slot"
+                return reservation_data
 
-            # 次へボタンをクリック（確認画面）
-            driver.find_element(By.ID, "nextPageBtn").click()
-            print("次へ（確認画面）のボタンをクリックしました。")
+            with span("lottery_button", **attributes):
+                wait_for(driver, "lottery_button", EC.element_to_be_clickable(element), 10).click()
+            logger.info(f"ボタンをクリックしました: {date}", extra=dict(attributes, stage="lottery_button"))
+            yield
+
+            with span("lottery_form", **attributes):
+                # 注意事項の同意チェック
+                wait_for(driver, "lottery_apply_form", EC.presence_of_element_located((By.ID, "a11y-06")), 10)
+                checkbox = driver.find_element(By.ID, "a11y-06")
+                if not checkbox.is_selected():
+                    checkbox.click()
+                    logger.info("注意事項への同意チェックボックスをチェックしました。", extra=dict(attributes, stage="lottery_form"))
+
+                # 緊急連絡先を入力
+                input_field = driver.find_element(By.ID, "a11y-01")
+                input_field.clear()
+                input_field.send_keys(PHONE_NUMBER)
+                # ログに電話番号を残さないよう、下4桁のみ出力
+                logger.info(f"電話番号 '***{(PHONE_NUMBER or '')[-4:]}' を入力しました。", extra=dict(attributes, stage="lottery_form"))
+
+                # 次へボタンをクリック（確認画面）
+                driver.find_element(By.ID, "nextPageBtn").click()
+            logger.info("次へ（確認画面）のボタンをクリックしました。", extra=dict(attributes, stage="lottery_form"))
+            yield
 
             # 確認画面で次へボタンをクリック
-            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, "//input[@value='次へ（完了画面）']"))).click()
-            print("次へ（完了画面）のボタンをクリックしました。")
+            with span("lottery_confirm", **attributes):
+                wait_for(driver, "lottery_confirm", EC.presence_of_element_located((By.XPATH, "//input[@value='次へ（完了画面）']")), 10).click()
+            timings["sent_at"] = time.time()
+            logger.info("次へ（完了画面）のボタンをクリックしました。", extra=dict(attributes, stage="lottery_confirm"))
+            yield
 
             # 完了画面から予約番号を取得
-            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CLASS_NAME, "first-child.last-child")))
-            reservation_number = driver.find_element(By.CLASS_NAME, "first-child.last-child").text.split("：")[1].strip()
+            with span("lottery_complete", **attributes):
+                wait_for(driver, "lottery_complete", EC.presence_of_element_located((By.CLASS_NAME, "first-child.last-child")), 10)
+                reservation_number = driver.find_element(By.CLASS_NAME, "first-child.last-child").text.split("：")[1].strip()
             reservation_data["reservation_number"] = reservation_number
-            print(f"予約番号を取得しました: {reservation_number}")
+            timings["confirmed_at"] = time.time()
+            logger.info(f"予約番号を取得しました: {reservation_number}",
+                        extra=dict(attributes, stage="lottery_complete", outcome="applied", reservation_number=reservation_number))
 
             # 受付完了後に「施設一覧に戻る」をクリック
-            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, "//input[@value='施設一覧に戻る']"))).click()
-            print("施設一覧に戻るボタンをクリックしました。")
+            with span("lottery_return", **attributes):
+                wait_for(driver, "lottery_return", EC.presence_of_element_located((By.XPATH, "//input[@value='施設一覧に戻る']")), 10).click()
+            logger.info("施設一覧に戻るボタンをクリックしました。", extra=dict(attributes, stage="lottery_return"))
+            yield
 
             return reservation_data
 
-        except TimeoutException:
+        except TimeoutException as e:
             # タイムアウトの場合は、申し込み済み（抽選待ち）の状態か確認
             try:
                 # 「抽選待ち」の表示を持つ要素を確認
-                applied_status = driver.find_element(By.XPATH, "//span[@class='rsv-status-text' and text()='抽選待ち']")
-                logger.info(f"施設: {facility_name}, 日付: {date.strftime('%Y/%m/%d')} は既に抽選申し込み済みです。ステータス: {applied_status.text}")
+                applied_status = driver.find_element(By.XPATH, APPLIED_STATUS_XPATH)
+                logger.info(f"施設: {facility_name}, 日付: {date.strftime('%Y/%m/%d')} は既に抽選申し込み済みです。ステータス: {applied_status.text}",
+                            extra=dict(attributes, stage="lottery_result", outcome="already_applied"))
                 # ここで申し込み済みの結果を記録する処理を追加する
                 reservation_data["status"] = "Already applied"
                 return reservation_data
             except NoSuchElementException:
-                logger.info(f"施設: {facility_name}, 日付: {date.strftime('%Y/%m/%d')} は予約状況が不明です。")
+                logger.info(f"施設: {facility_name}, 日付: {date.strftime('%Y/%m/%d')} は予約状況が不明です。",
+                            extra=dict(attributes, stage="lottery_result", outcome="unknown"))
                 reservation_data["status"] = f"Failed: {str(e)}"
                 return reservation_data
 
     except Exception as e:
-        logger.error(f"施設: {facility_name}, 日付: {date.strftime('%Y/%m/%d')} の検索中にエラーが発生: {str(e)}")
+        if is_session_expired(driver):
+            raise SessionExpiredError(str(e)) from e
+        logger.error(f"施設: {facility_name}, 日付: {date.strftime('%Y/%m/%d')} の検索中にエラーが発生: {str(e)}",
+                     extra={"facility": facility_name, "date": date.strftime("%Y/%m/%d"), "stage": "lottery", "outcome": "error"})
         reservation_data["status"] = f"Failed: {str(e)}"
         return reservation_data
 
+
+
+# 抽選申し込みの共通関数
+def apply_for_facility_lottery(driver, logger, facility_name, date, form_state=None, timings=None):
+    """
+    指定した施設名と日付で抽選申し込み。
+    timings に辞書を渡すと、検索・送信・完了の時刻（time.time()）を記録する。
+    """
+    if form_state is None:
+        form_state = get_form_state(driver)
+    if timings is None:
+        timings = {}
+    return run_steps(lottery_steps(driver, logger, facility_name, date, form_state, timings))
@@ -0,0 +1,162 @@
+"""
+ログイン済みのブラウザ（またはHTTPセッション）を起動したまま保持し、
+Unixソケット（FUN_NAVI_DAEMON_SOCKET）経由で空き状況検索・予約履歴取得・抽選申し込みを受け付ける常駐サービス。
+各スクリプトは起動中の常駐サービスに接続できる場合、ブラウザを起動せずにこちらを使う。
+
+リクエスト・応答はどちらも1行のJSON。
+    {"op": "search", "facility_name": "...", "date": "YYYY/MM/DD"}  → {"ok": true, "result": [{"facility_name", "slot", "status"}, ...]}
+    {"op": "reservations", "now": "ISO形式（省略可）", "known": {予約番号: ステータス}（省略可）}
+    {"op": "apply", "facility_name": "...", "date": "YYYY/MM/DD"}
+    {"op": "ping"} / {"op": "status"} / {"op": "shutdown"}
+"""
+from fun_navi_common import configure_logging, apply_for_facility_lottery, with_relogin
+from fun_navi_backend import SeleniumBackend
+from fun_navi_engine import create_resilient_backend, unwrap_backend
+from fun_navi_client import daemon_socket_path
+from dataclasses import asdict
+from datetime import datetime
+from queue import Queue
+import json
+import os
+import socketserver
+import threading
+import time
+
+logger = configure_logging()
+
+WORKERS = int(os.getenv("FUN_NAVI_DAEMON_WORKERS", "1"))
+
+
+def _selenium_driver(backend):
+    """抽選申し込み用にSeleniumのWebDriverを取得する（HTTPバックエンドの場合は None）"""
+    backend = unwrap_backend(backend)
+    return backend.driver if isinstance(backend, SeleniumBackend) else None
+
+
+class WarmBackendPool:
+    """ログイン済みのバックエンドを保持し、1リクエストずつ貸し出す"""
+
+    def __init__(self, size):
+        self.backends = []
+        self.idle = Queue()
+        self.started_at = time.time()
+        self.requests = 0
+        self._lock = threading.Lock()
+        for i in range(size):
+            backend = create_resilient_backend(logger, use_daemon=False)
+            backend.login()
+            logger.info(f"バックエンド{i + 1}/{size}（{backend.name}）のログインが完了しました")
+            self.backends.append(backend)
+            self.idle.put(backend)
+
+    def run(self, func, *args):
+        backend = self.idle.get()
+        try:
+            with self._lock:
+                self.requests += 1
+            return func(backend, *args)
+        finally:
+            self.idle.put(backend)
+
+    def status(self):
+        return {
+            "workers": len(self.backends),
+            "idle": self.idle.qsize(),
+            "backends": [backend.name for backend in self.backends],
+            "requests": self.requests,
+            "uptime_sec": round(time.time() - self.started_at),
+        }
+
+    def quit(self):
+        for backend in self.backends:
+            try:
+                backend.quit()
+            except Exception as e:
+                logger.warning(f"バックエンドの終了中にエラーが発生: {e}")
+
+
+def _search(backend, facility_name, date):
+    slots = backend.search_slots(facility_name, datetime.strptime(date, "%Y/%m/%d"))
+    return [asdict(slot) for slot in slots]
+
+
+def _reservations(backend, now, known):
+    return backend.fetch_reservations(datetime.fromisoformat(now) if now else None, known)
+
+
+def _apply(backend, facility_name, date):
+    driver = _selenium_driver(backend)
+    if driver is None:
+        raise ValueError("抽選申し込みはSeleniumバックエンドでのみ実行できます")
+    return with_relogin(driver, logger, apply_for_facility_lottery, facility_name, date)
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    """1つの接続で、1行ごとのリクエストを順に処理する"""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                response = {"ok": True, "result": self.dispatch(request)}
+            except Exception as e:
+                logger.error(f"リクエストの処理中にエラーが発生: {e}")
+                response = {"ok": False, "error": str(e), "type": type(e).__name__}
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+    def dispatch(self, request):
+        pool = self.server.pool
+        op = request.get("op")
+        if op == "ping":
+            return "pong"
+        if op == "status":
+            return pool.status()
+        if op == "search":
+            return pool.run(_search, request["facility_name"], request["date"])
+        if op == "reservations":
+            return pool.run(_reservations, request.get("now"), request.get("known"))
+        if op == "apply":
+            return pool.run(_apply, request["facility_name"], request["date"])
+        if op == "shutdown":
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+            return "bye"
+        raise ValueError(f"不明な操作です: {op}")
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(path=None, workers=WORKERS):
+    path = path or daemon_socket_path()
+    if os.path.exists(path):
+        # 前回異常終了した場合のソケットファイルを削除
+        os.unlink(path)
+
+    pool = WarmBackendPool(max(1, workers))
+    # 他のユーザーから接続できないよう、所有者のみ読み書きできる権限で作成
+    old_umask = os.umask(0o177)
+    try:
+        server = DaemonServer(path, DaemonHandler)
+    finally:
+        os.umask(old_umask)
+    server.pool = pool
+
+    logger.info(f"常駐サービスを開始しました: {path}（バックエンド{len(pool.backends)}個）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+        pool.quit()
+        logger.info("常駐サービスを終了しました")
+
+
+if __name__ == "__main__":
+    serve()
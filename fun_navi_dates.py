@@ -0,0 +1,150 @@
+"""
+検索・申し込み対象の日付の計算。
+複数年分の土日・祝日の暦を配列（numpy）で1回だけ作成して使い回し、
+期間内の日付の絞り込み（休祝日のみ・曜日・第n週末・休前日）を配列演算で行う。
+"""
+from datetime import date as date_type, datetime, timedelta
+import os
+import threading
+import holidays
+import numpy as np
+
+WEEKDAY_NAMES = "月火水木金土日"
+
+# 暦を作成する範囲（今年の前後何年分か）
+YEARS_BEFORE = 1
+YEARS_AFTER = 3
+
+_calendar = None
+_calendar_lock = threading.Lock()
+
+
+def _day(date):
+    """datetime / date / YYYY/MM/DD を numpy の日付にする"""
+    if isinstance(date, str):
+        date = datetime.strptime(date, "%Y/%m/%d")
+    if isinstance(date, datetime):
+        date = date.date()
+    return np.datetime64(date, "D")
+
+
+def format_dates(days):
+    """numpy の日付の配列を YYYY/MM/DD の文字列のリストにする"""
+    return [day.replace("-", "/") for day in np.datetime_as_string(days, unit="D").tolist()]
+
+
+def parse_weekdays(value):
+    """「土,日」や「5,6」を曜日（月曜=0）のリストにする"""
+    weekdays = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        weekdays.append(WEEKDAY_NAMES.index(item) if item in WEEKDAY_NAMES else int(item))
+    return weekdays
+
+
+class HolidayCalendar:
+    """first_year〜last_year の日ごとの 曜日・祝日・休日（土日祝）・月内の日 の配列"""
+
+    def __init__(self, first_year, last_year):
+        self.first_year = first_year
+        self.last_year = last_year
+        self.days = np.arange(np.datetime64(f"{first_year}-01-01"), np.datetime64(f"{last_year + 1}-01-01"))
+        japan_holidays = holidays.Japan(years=range(first_year, last_year + 1))
+        self.holiday = np.isin(self.days, np.array(sorted(japan_holidays), dtype="datetime64[D]"))
+        # 月曜を0とする曜日（1970/01/01は木曜）
+        self.weekday = (self.days.astype(np.int64) + 3) % 7
+        self.off = (self.weekday >= 5) | self.holiday
+        self.day_of_month = (self.days - self.days.astype("datetime64[M]")).astype(np.int64) + 1
+
+    def covers(self, start, end):
+        return self.days[0] <= _day(start) and _day(end) < self.days[-1]
+
+    def index(self, date):
+        return int((_day(date) - self.days[0]).astype(np.int64))
+
+    def is_off(self, date):
+        return bool(self.off[self.index(date)])
+
+    def select(self, start, end, holidays_only=False, weekdays=None, nth_weekends=None, holiday_eves=False):
+        """
+        start〜end（両端を含む）のうち、指定した条件のいずれかに当てはまる日を返す（条件の指定がなければ全ての日）。
+        holidays_only: 土日祝日 / weekdays: 曜日（月曜=0）のリスト /
+        nth_weekends: 月の第n週末（その月のn回目の土曜・日曜）のリスト / holiday_eves: 休前日（翌日が土日祝日の日）
+        """
+        window = slice(self.index(start), self.index(end) + 1)
+        weekday = self.weekday[window]
+        selectors = []
+        if holidays_only:
+            selectors.append(self.off[window])
+        if weekdays:
+            selectors.append(np.isin(weekday, list(weekdays)))
+        if nth_weekends:
+            nth = (self.day_of_month[window] - 1) // 7 + 1
+            selectors.append((weekday >= 5) & np.isin(nth, list(nth_weekends)))
+        if holiday_eves:
+            selectors.append(self.off[window.start + 1:window.stop + 1])
+
+        days = self.days[window]
+        if not selectors:
+            return days
+        return days[np.logical_or.reduce(selectors)]
+
+
+def get_calendar(start=None, end=None):
+    """start〜end を含む暦を返す（範囲外の日付を指定した場合は作り直す）"""
+    global _calendar
+    today = date_type.today()
+    start = start or today
+    end = end or today
+    with _calendar_lock:
+        if _calendar is None or not _calendar.covers(start, _day(end) + 1):
+            first_year = min(_day(start).astype(object).year, today.year - YEARS_BEFORE)
+            last_year = max((_day(end) + 1).astype(object).year, today.year + YEARS_AFTER)
+            _calendar = HolidayCalendar(first_year, last_year)
+        return _calendar
+
+
+def is_weekend_or_holiday(date):
+    return get_calendar(date, date).is_off(date)
+
+
+def _parse_date_list(value):
+    return np.array(
+        [_day(item.strip()) for item in value.split(",") if item.strip()],
+        dtype="datetime64[D]",
+    )
+
+
+# 検索・申し込み対象の日付リストの作成
+def get_dates_range(start_date, end_date, prefix):
+    """
+    開始日と終了日で指定された範囲の日付リストを生成。
+    環境変数 {prefix}_HOLIDAYS_ONLY・_WEEKDAYS・_NTH_WEEKENDS・_HOLIDAY_EVES のいずれかに当てはまる日に絞り込み、
+    除外日と追加日（{prefix}_EXCLUDED_DATES・_ADDITIONAL_DATES）を考慮する。
+    """
+    weekdays = parse_weekdays(os.getenv(f"{prefix}_WEEKDAYS", ""))
+    nth_weekends = [int(n) for n in os.getenv(f"{prefix}_NTH_WEEKENDS", "").split(",") if n.strip()]
+    days = get_calendar(start_date, end_date).select(
+        start_date, end_date,
+        holidays_only=os.getenv(f"{prefix}_HOLIDAYS_ONLY", "false").lower() == "true",
+        weekdays=weekdays,
+        nth_weekends=nth_weekends,
+        holiday_eves=os.getenv(f"{prefix}_HOLIDAY_EVES", "false").lower() == "true",
+    )
+
+    # 追加日を加え、除外日を除いて昇順にする
+    excluded_dates = _parse_date_list(os.getenv(f"{prefix}_EXCLUDED_DATES", ""))
+    additional_dates = _parse_date_list(os.getenv(f"{prefix}_ADDITIONAL_DATES", ""))
+    days = np.setdiff1d(np.union1d(days, additional_dates), excluded_dates)
+    return format_dates(days)
+
+
+def split_by_day_off(start, days_ahead):
+    """start から days_ahead 日先までの日付を、土日祝日とそれ以外に分けて返す（YYYY/MM/DD）"""
+    end = start + timedelta(days=days_ahead)
+    calendar = get_calendar(start, end)
+    window = slice(calendar.index(start), calendar.index(end) + 1)
+    days, off = calendar.days[window], calendar.off[window]
+    return format_dates(days[off]), format_dates(days[~off])
@@ -0,0 +1,239 @@
+"""
+バックエンドの処理の再試行・サイトの遅延時の一時停止・ブラウザの定期的な再起動。
+エラーを 一時的なもの（transient）・セッション切れ（session_expired）・ページの構成変更（page_changed）に分類し、
+一時的なエラーとセッション切れは間隔（ジッター付きの指数バックオフ）を空けて再試行する。
+ページの構成変更は再試行しても解決しないため、そのままエラーにする（「空きなし」とは扱わない）。
+"""
+from fun_navi_backend import create_backend, SeleniumBackend, FallbackBackend
+from fun_navi_client import DaemonError
+from fun_navi_common import get_form_state, new_form_state
+from fun_navi_metrics import process_tree_memory_mb
+from fun_navi_session import SessionExpiredError
+from selenium.common.exceptions import (
+    NoSuchElementException, WebDriverException, InvalidSessionIdException, NoSuchWindowException
+)
+import os
+import random
+import threading
+import time
+
+TRANSIENT = "transient"
+SESSION_EXPIRED = "session_expired"
+PAGE_CHANGED = "page_changed"
+
+# ブラウザが終了・切断した場合のエラーメッセージ
+_DRIVER_LOST_MESSAGES = ("chrome not reachable", "disconnected", "session deleted", "target window already closed")
+
+
+def classify_error(error):
+    """エラーを TRANSIENT / SESSION_EXPIRED / PAGE_CHANGED に分類する"""
+    if isinstance(error, DaemonError):
+        if error.type == "SessionExpiredError":
+            return SESSION_EXPIRED
+        if error.type in ("NoSuchElementException", "HttpBackendError"):
+            return PAGE_CHANGED
+        return TRANSIENT
+    if isinstance(error, SessionExpiredError):
+        return SESSION_EXPIRED
+    if isinstance(error, NoSuchElementException):
+        return PAGE_CHANGED
+    # タイムアウト・古くなった要素（StaleElementReference）・通信エラー
+    if isinstance(error, (WebDriverException, OSError, TimeoutError)):
+        return TRANSIENT
+    # 解析できないページなど
+    return PAGE_CHANGED
+
+
+def is_driver_lost(error):
+    """ブラウザが応答しなくなったか（再起動が必要か）"""
+    if isinstance(error, (InvalidSessionIdException, NoSuchWindowException)):
+        return True
+    return isinstance(error, WebDriverException) and any(
+        message in str(error).lower() for message in _DRIVER_LOST_MESSAGES)
+
+
+def backoff_delay(attempt, base=None, cap=None):
+    """attempt 回目（0始まり）の再試行までの待ち時間（0〜base×2^attempt 秒の一様乱数、上限 cap 秒）"""
+    base = float(os.getenv("ENGINE_BACKOFF_BASE_SECONDS", "1")) if base is None else base
+    cap = float(os.getenv("ENGINE_BACKOFF_MAX_SECONDS", "30")) if cap is None else cap
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    失敗（または slow_seconds 秒以上かかった処理）が failure_threshold 回続いた場合、
+    cooldown 秒間は全ての処理を止め、サイトへの負荷を下げる。複数スレッドで共有できる。
+    """
+
+    def __init__(self, failure_threshold=5, slow_seconds=20.0, cooldown=60.0, logger=None):
+        self.failure_threshold = failure_threshold
+        self.slow_seconds = slow_seconds
+        self.cooldown = cooldown
+        self.logger = logger
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, logger=None):
+        return cls(
+            failure_threshold=int(os.getenv("ENGINE_BREAKER_FAILURES", "5")),
+            slow_seconds=float(os.getenv("ENGINE_BREAKER_SLOW_SECONDS", "20")),
+            cooldown=float(os.getenv("ENGINE_BREAKER_COOLDOWN_SECONDS", "60")),
+            logger=logger,
+        )
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def before_call(self):
+        """停止中であれば、停止が終わるまで待つ"""
+        with self._lock:
+            remaining = 0 if self.opened_at is None else self.opened_at + self.cooldown - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def record(self, success, duration):
+        with self._lock:
+            if success and duration < self.slow_seconds:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.failures >= self.failure_threshold and (
+                    self.opened_at is None or time.monotonic() >= self.opened_at + self.cooldown):
+                self.opened_at = time.monotonic()
+                if self.logger is not None:
+                    self.logger.warning(f"サイトの応答が遅い・失敗が{self.failures}回続いたため、{self.cooldown:.0f}秒間処理を止めます")
+
+
+# 同じサイトにアクセスする全てのバックエンドで共有する
+_shared_breaker = None
+_shared_breaker_lock = threading.Lock()
+
+
+def shared_breaker(logger=None):
+    global _shared_breaker
+    with _shared_breaker_lock:
+        if _shared_breaker is None:
+            _shared_breaker = CircuitBreaker.from_env(logger)
+        return _shared_breaker
+
+
+def backend_memory_mb(backend):
+    """バックエンドのブラウザ（chromedriverと子孫プロセス）のメモリ使用量（MB、ブラウザがない場合は 0）"""
+    if isinstance(backend, FallbackBackend):
+        backend = backend.active
+    if not isinstance(backend, SeleniumBackend):
+        return 0.0
+    process = getattr(backend.driver.service, "process", None)
+    return process_tree_memory_mb(process.pid) if process is not None else 0.0
+
+
+class ResilientBackend:
+    """
+    バックエンドの処理を再試行し、ENGINE_RECYCLE_OPERATIONS 回の処理ごと、
+    またはブラウザのメモリ使用量が ENGINE_RECYCLE_MEMORY_MB を超えた場合にバックエンドを作り直す。
+    抽選申し込みは再試行すると二重に申し込む可能性があるため対象外。
+    """
+
+    def __init__(self, logger, factory, breaker=None):
+        self.logger = logger
+        self.factory = factory
+        self.breaker = breaker or shared_breaker(logger)
+        self.max_attempts = max(1, int(os.getenv("ENGINE_MAX_ATTEMPTS", "3")))
+        self.recycle_operations = int(os.getenv("ENGINE_RECYCLE_OPERATIONS", "200"))
+        self.recycle_memory_mb = float(os.getenv("ENGINE_RECYCLE_MEMORY_MB", "1500"))
+        self.backend = factory()
+        self.operations = 0
+        self.restarts = 0
+
+    @property
+    def name(self):
+        return self.backend.name
+
+    def restart(self, reason):
+        self.logger.warning(f"バックエンドを再起動します: {reason}", extra={"stage": "restart", "operations": self.operations})
+        try:
+            self.backend.quit()
+        except Exception as e:
+            self.logger.debug(f"バックエンドの終了中にエラーが発生: {e}")
+        self.backend = self.factory()
+        self.backend.login()
+        self.operations = 0
+        self.restarts += 1
+
+    def _recycle_if_needed(self):
+        if self.recycle_operations and self.operations >= self.recycle_operations:
+            self.restart(f"{self.operations}回処理しました")
+            return
+        if self.recycle_memory_mb and self.operations:
+            memory_mb = backend_memory_mb(self.backend)
+            if memory_mb > self.recycle_memory_mb:
+                self.restart(f"メモリ使用量が{memory_mb:.0f}MBになりました")
+
+    def _reset_form_state(self):
+        backend = unwrap_backend(self)
+        if isinstance(backend, SeleniumBackend):
+            get_form_state(backend.driver).update(new_form_state())
+
+    def _call(self, method, *args):
+        for attempt in range(self.max_attempts):
+            if method != "login":
+                self._recycle_if_needed()
+            self.breaker.before_call()
+            started = time.monotonic()
+            try:
+                result = getattr(self.backend, method)(*args)
+            except Exception as e:
+                self.breaker.record(False, time.monotonic() - started)
+                kind = classify_error(e)
+                if kind == PAGE_CHANGED or attempt + 1 == self.max_attempts:
+                    raise
+                delay = backoff_delay(attempt)
+                self.logger.warning(f"{method}に失敗したため、{delay:.1f}秒後に再試行します"
+                                    f"（{attempt + 1}/{self.max_attempts}回目, {kind}）: {e}",
+                                    extra={"stage": method, "outcome": "retry", "error_kind": kind, "attempt": attempt + 1})
+                time.sleep(delay)
+                if is_driver_lost(e):
+                    self.restart("ブラウザが応答しません")
+                    continue
+                # 失敗した処理で入力途中の検索フォームを、入力済みとみなさないようにする
+                self._reset_form_state()
+                if kind == SESSION_EXPIRED:
+                    self.backend.login()
+                continue
+
+            self.breaker.record(True, time.monotonic() - started)
+            self.operations += 1
+            return result
+
+    def login(self):
+        self._call("login")
+
+    def search_availability(self, facility_name, date):
+        return self._call("search_availability", facility_name, date)
+
+    def search_slots(self, facility_name, date):
+        return self._call("search_slots", facility_name, date)
+
+    def fetch_reservations(self, now=None, known=None):
+        return self._call("fetch_reservations", now, known)
+
+    def quit(self):
+        self.backend.quit()
+
+
+def create_resilient_backend(logger, use_daemon=True, breaker=None):
+    """create_backend のバックエンドを ResilientBackend で包んで返す"""
+    return ResilientBackend(logger, lambda: create_backend(logger, use_daemon), breaker)
+
+
+def unwrap_backend(backend):
+    """ResilientBackend・FallbackBackend の中で実際に処理しているバックエンド"""
+    if isinstance(backend, ResilientBackend):
+        backend = backend.backend
+    if isinstance(backend, FallbackBackend):
+        backend = backend.active
+    return backend
@@ -0,0 +1,343 @@
+"""
+fun naviの画面遷移と、スクリプトが参照する要素（ID・クラス）を再現したローカルのテスト用サーバー。
+実サイトにアクセスせずに、ログイン・空き状況検索・抽選申し込み・予約履歴取得の動作確認と性能計測を行う。
+
+    python3 fun_navi_fake_server.py --port 8000 --latency-ms 200 --reservation-pages 20
+
+LOGIN_URL=http://127.0.0.1:8000/frpc010g.jsp を指定すると各スクリプトがこのサーバーを使う。
+"""
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime, timedelta
+from html import escape
+from urllib.parse import urlparse, parse_qs
+from dateutil.relativedelta import relativedelta
+from fun_navi_logging import configure_logging
+import argparse
+import hashlib
+import itertools
+import random
+import threading
+import time
+import uuid
+
+DEFAULT_FACILITIES = [
+    "SEA／E棟1階_PARTY ROOM OCEAN_昼",
+    "SEA／E棟1階_PARTY ROOM OCEAN_夜",
+    "SEA／E棟17階_PARTY ROOM SKY_昼",
+    "SEA／E棟17階_PARTY ROOM SKY_夜",
+    "PARK／A棟1階_PARTY ROOM GARDEN",
+]
+SLOTS = ["09:00～12:00", "13:00～17:00", "18:00～21:00"]
+WEEKDAYS = "月火水木金土日"
+
+
+class FakeFunNaviConfig:
+    """
+    テスト用サーバーの設定（応答の遅延、予約履歴のページ数など）。
+    now を指定すると、予約履歴と抽選受付の月をその日時を基準に作成する（フィクスチャの記録用。省略時は現在日時）。
+    """
+
+    def __init__(self, latency_ms=0, jitter_ms=0, reservation_pages=3, rows_per_page=10,
+                 facilities=None, available_ratio=0.3, session_ttl_seconds=0, now=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.reservation_pages = reservation_pages
+        self.rows_per_page = rows_per_page
+        self.facilities = facilities or DEFAULT_FACILITIES
+        self.available_ratio = available_ratio
+        self.session_ttl_seconds = session_ttl_seconds
+        self.now = now
+
+
+def _page(title, body):
+    return (
+        "<!DOCTYPE html><html lang=\"ja\"><head><meta charset=\"utf-8\">"
+        f"<title>{escape(title)}</title></head><body>"
+        "<div id=\"loading\" style=\"display:none\">読み込み中</div>"
+        f"{body}</body></html>"
+    )
+
+
+def _format_datetime(value):
+    return f"{value:%Y/%m/%d}({WEEKDAYS[value.weekday()]}) {value:%H:%M}"
+
+
+class FakeFunNaviState:
+    """ログインセッションと申し込み内容（スレッド間で共有）"""
+
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.reservation_numbers = itertools.count(100001)
+        self.history = self._build_history()
+
+    def now(self):
+        return self.config.now or datetime.now()
+
+    def _build_history(self):
+        """予約履歴（新しい順）。1ページ目のみ先日付の予約を含む"""
+        now = self.now().replace(minute=0, second=0, microsecond=0)
+        total = self.config.reservation_pages * self.config.rows_per_page
+        history = []
+        for i in range(total):
+            offset = timedelta(days=14 - i * 3)
+            start = now + offset
+            history.append({
+                "start": start,
+                "end": start + timedelta(hours=3),
+                "facility_name": self.config.facilities[i % len(self.config.facilities)],
+                "reservation_number": f"H{900000 - i}",
+                "status": "当選" if offset.days > 0 else "利用済み",
+            })
+        return history
+
+    def slot_status(self, facility_name, date, slot, applied):
+        """施設・日付・時間帯ごとに決まった空き状況を返す（2ヶ月後の月は抽選受付）"""
+        if (facility_name, date, slot) in applied:
+            return "applied"
+        lottery_month = self.now() + relativedelta(months=2)
+        if (date.year, date.month) == (lottery_month.year, lottery_month.month):
+            return "drawing"
+        digest = hashlib.sha1(f"{facility_name}|{date:%Y%m%d}|{slot}".encode("utf-8")).digest()
+        return "available" if digest[0] / 255 < self.config.available_ratio else "unavailable"
+
+
+class FakeFunNaviHandler(BaseHTTPRequestHandler):
+    server_version = "FakeFunNavi/1.0"
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    # 共通処理
+    def _delay(self):
+        config = self.state.config
+        latency = config.latency_ms + (random.uniform(0, config.jitter_ms) if config.jitter_ms else 0)
+        if latency:
+            time.sleep(latency / 1000)
+
+    def _send(self, html, status=200, cookie=None):
+        body = html.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if cookie:
+            self.send_header("Set-Cookie", cookie)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _params(self):
+        params = parse_qs(urlparse(self.path).query)
+        if self.command == "POST":
+            length = int(self.headers.get("Content-Length", 0))
+            params.update(parse_qs(self.rfile.read(length).decode("utf-8")))
+        return {key: values[0] for key, values in params.items()}
+
+    def _session(self):
+        cookie = SimpleCookie(self.headers.get("Cookie", ""))
+        session_id = cookie["FAKESESSIONID"].value if "FAKESESSIONID" in cookie else None
+        with self.state.lock:
+            session = self.state.sessions.get(session_id)
+            ttl = self.state.config.session_ttl_seconds
+            if session and ttl and time.time() - session["created_at"] > ttl:
+                del self.state.sessions[session_id]
+                return None
+            return session
+
+    def do_GET(self):
+        self._route()
+
+    def do_POST(self):
+        self._route()
+
+    def _route(self):
+        self._delay()
+        path = urlparse(self.path).path.lstrip("/")
+        params = self._params()
+
+        if path in ("", "frpc010g.jsp"):
+            return self._send(self._login_page())
+        if path == "FRPC010G_LoginAction.do" and self.command == "POST":
+            return self._login(params)
+
+        session = self._session()
+        if session is None:
+            # セッション切れはログイン画面を表示
+            return self._send(self._login_page())
+
+        routes = {
+            "FRPC010G_LoginAction.do": self._search_page,
+            "search.do": self._search,
+            "apply.do": self._apply_page,
+            "applyConfirm.do": self._apply_confirm,
+            "applyComplete.do": self._apply_complete,
+            "reserveList.do": self._reserve_list,
+        }
+        handler = routes.get(path)
+        if handler is None:
+            return self._send(_page("Not Found", "<p>ページが見つかりません</p>"), status=404)
+        return handler(session, params)
+
+    # ログイン
+    def _login_page(self):
+        return _page("ログイン", (
+            "<form action=\"FRPC010G_LoginAction.do\" method=\"post\">"
+            "<input type=\"text\" id=\"a11y-01\" name=\"userId\">"
+            "<input type=\"password\" id=\"a11y-02\" name=\"password\">"
+            "<input type=\"submit\" value=\"ログイン\">"
+            "</form>"
+        ))
+
+    def _login(self, params):
+        if not params.get("userId") or not params.get("password"):
+            return self._send(self._login_page())
+        session_id = uuid.uuid4().hex
+        session = {"created_at": time.time(), "keyword": "", "date": "", "applied": {}, "user_id": params["userId"]}
+        with self.state.lock:
+            self.state.sessions[session_id] = session
+        self._send(self._render_search(session, None), cookie=f"FAKESESSIONID={session_id}; Path=/; HttpOnly")
+
+    # 施設検索
+    def _render_search(self, session, results):
+        form = (
+            "<form action=\"search.do\" method=\"get\">"
+            f"<input type=\"text\" id=\"keyword\" name=\"keyword\" value=\"{escape(session['keyword'])}\">"
+            f"<input type=\"text\" id=\"useDateArea\" name=\"useDate\" value=\"{escape(session['date'])}\">"
+            "<input type=\"submit\" id=\"search\" name=\"search\" value=\"絞り込み\">"
+            "</form>"
+            "<a href=\"reserveList.do?method=do_ReserveInfoListGeneral\">予約の確認</a>"
+        )
+        return _page("施設一覧", form + (results or ""))
+
+    def _search_page(self, session, params):
+        self._send(self._render_search(session, None))
+
+    def _search(self, session, params):
+        session["keyword"] = params.get("keyword", "")
+        session["date"] = params.get("useDate", "")
+        try:
+            date = datetime.strptime(session["date"], "%Y/%m/%d")
+        except ValueError:
+            return self._send(self._render_search(session, "<p class=\"error\">日付を正しく入力してください</p>"))
+
+        facilities = [name for name in self.state.config.facilities if session["keyword"] in name]
+        blocks = []
+        for facility_name in facilities:
+            buttons = []
+            for slot in SLOTS:
+                status = self.state.slot_status(facility_name, date, slot, session["applied"])
+                if status == "available":
+                    buttons.append(f"<input type=\"button\" class=\"time-rsv-available-btn\" value=\"{slot}\">")
+                elif status == "drawing":
+                    href = f"apply.do?facility={escape(facility_name)}&amp;date={date:%Y/%m/%d}&amp;slot={escape(slot)}"
+                    buttons.append(f"<a class=\"time-drawing-available-btn\" href=\"{href}\">{slot}</a>")
+                elif status == "applied":
+                    buttons.append(f"<span class=\"time-rsv-applied-btn\">{slot}<span class=\"rsv-status-text\">抽選待ち</span></span>")
+                else:
+                    buttons.append(f"<span class=\"time-rsv-unavailable-btn\">{slot}</span>")
+            blocks.append(f"<h3>{escape(facility_name)}</h3><div class=\"status-area47\">{''.join(buttons)}</div>")
+        if not blocks:
+            blocks.append("<div class=\"status-area47\"><p>該当する施設がありません</p></div>")
+        self._send(self._render_search(session, "".join(blocks)))
+
+    # 抽選申し込み
+    def _hidden_fields(self, params):
+        return "".join(
+            f"<input type=\"hidden\" name=\"{name}\" value=\"{escape(params.get(name, ''))}\">"
+            for name in ("facility", "date", "slot")
+        )
+
+    def _apply_page(self, session, params):
+        self._send(_page("申し込み", (
+            "<form action=\"applyConfirm.do\" method=\"post\">"
+            f"{self._hidden_fields(params)}"
+            "<input type=\"checkbox\" id=\"a11y-06\" name=\"agree\" value=\"1\"><label for=\"a11y-06\">注意事項に同意する</label>"
+            "<input type=\"text\" id=\"a11y-01\" name=\"phone\">"
+            "<input type=\"submit\" id=\"nextPageBtn\" value=\"次へ（確認画面）\">"
+            "</form>"
+        )))
+
+    def _apply_confirm(self, session, params):
+        self._send(_page("確認", (
+            "<form action=\"applyComplete.do\" method=\"post\">"
+            f"{self._hidden_fields(params)}"
+            f"<p>緊急連絡先: {escape(params.get('phone', ''))}</p>"
+            "<input type=\"submit\" value=\"次へ（完了画面）\">"
+            "</form>"
+        )))
+
+    def _apply_complete(self, session, params):
+        key = (params.get("facility", ""), datetime.strptime(params.get("date"), "%Y/%m/%d"), params.get("slot", ""))
+        with self.state.lock:
+            reservation_number = f"R{next(self.state.reservation_numbers)}"
+            session["applied"][key] = reservation_number
+        self._send(_page("完了", (
+            f"<ul><li class=\"first-child last-child\">予約番号：{reservation_number}</li></ul>"
+            "<form action=\"FRPC010G_LoginAction.do\" method=\"get\">"
+            "<input type=\"submit\" value=\"施設一覧に戻る\">"
+            "</form>"
+        )))
+
+    # 予約履歴
+    def _reserve_list(self, session, params):
+        page = int(params.get("page", "1"))
+        rows_per_page = self.state.config.rows_per_page
+        applied = [
+            {"start": date.replace(hour=int(slot[:2])), "end": date.replace(hour=int(slot[6:8])),
+             "facility_name": facility_name, "reservation_number": number, "status": "抽選待ち"}
+            for (facility_name, date, slot), number in session["applied"].items()
+        ]
+        history = applied + self.state.history
+        rows = history[(page - 1) * rows_per_page:page * rows_per_page]
+
+        tbody = "".join(
+            "<tr>"
+            f"<td>{_format_datetime(row['start'])}</td><td>{_format_datetime(row['end'])}</td>"
+            f"<td>{escape(row['facility_name'])}</td><td>{row['reservation_number']}</td><td>{row['status']}</td>"
+            "</tr>"
+            for row in rows
+        )
+        next_link = ""
+        if page * rows_per_page < len(history):
+            next_link = f"<a href=\"reserveList.do?method=do_NextPage&amp;page={page + 1}\">次へ</a>"
+        self._send(_page("予約の確認", (
+            "<div class=\"section view-list first-child last-child\">"
+            "<table class=\"striped01\"><thead><tr><th>開始</th><th>終了</th><th>施設</th><th>予約番号</th><th>状態</th></tr></thead>"
+            f"<tbody>{tbody}</tbody></table>{next_link}</div>"
+        )))
+
+
+def start_fake_server(config=None, host="127.0.0.1", port=0):
+    """テスト用サーバーを別スレッドで起動し、(server, ログインURL) を返す"""
+    handler = type("Handler", (FakeFunNaviHandler,), {"state": FakeFunNaviState(config or FakeFunNaviConfig())})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/frpc010g.jsp"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="fun naviのテスト用サーバー")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency-ms", type=float, default=0, help="1リクエストあたりの応答遅延（ミリ秒）")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="応答遅延のばらつき（ミリ秒）")
+    parser.add_argument("--reservation-pages", type=int, default=3, help="予約履歴のページ数")
+    parser.add_argument("--rows-per-page", type=int, default=10, help="予約履歴の1ページあたりの件数")
+    parser.add_argument("--session-ttl", type=float, default=0, help="セッションの有効期間（秒、0は無期限）")
+    args = parser.parse_args()
+
+    server, login_url = start_fake_server(FakeFunNaviConfig(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, reservation_pages=args.reservation_pages,
+        rows_per_page=args.rows_per_page, session_ttl_seconds=args.session_ttl,
+    ), port=args.port)
+    # LOG_LEVEL などを .env で指定している場合に備えて読み込む
+    from dotenv import load_dotenv
+    load_dotenv(override=True)
+    configure_logging().info(f"テスト用サーバーを起動しました: LOGIN_URL={login_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
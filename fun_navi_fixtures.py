@@ -0,0 +1,265 @@
+"""
+ページのHTML（フィクスチャ）の記録と、記録したページでの解析処理の確認・性能計測。
+FIXTURE_RECORD_DIR を指定して各スクリプトを実行すると、読み込んだページのHTMLを
+ログインID・パスワード・電話番号・メールアドレスなどを伏せた上で保存する（同じ内容のページは1回のみ）。
+保存したページは、ブラウザ・サイトなしで解析処理（fun_navi_parser）に通し、正解（.json）と比較できる。
+
+    python3 fun_navi_fixtures.py record-fake     # テスト用サーバーのページを記録
+    python3 fun_navi_fixtures.py update          # 現在の解析結果を正解として保存
+    python3 fun_navi_fixtures.py check           # 正解と比較（違いがある・ページがない場合は終了コード1）
+    python3 fun_navi_fixtures.py bench --iterations 200
+"""
+from fun_navi_parser import (
+    parse_html, find_form_with, has_status_area, extract_slots, find_reservation_rows,
+    extract_reservations, parse_datetime_with_weekday
+)
+from fun_navi_logging import configure_logging
+from dataclasses import asdict
+from datetime import datetime, timedelta
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import time
+
+logger = logging.getLogger("fun_navi.fixtures")
+
+DEFAULT_DIR = "fixtures"
+SCRUBBED = "SCRUBBED"
+
+# record-fake の基準日時（毎回同じページを記録できるよう固定する）
+FAKE_NOW = datetime(2025, 4, 1, 9, 0)
+
+_INPUT_TAG = re.compile(r"<input\b[^>]*>", re.IGNORECASE)
+_INPUT_TYPE = re.compile(r"""\btype\s*=\s*["']?(password|hidden)\b""", re.IGNORECASE)
+_INPUT_VALUE = re.compile(r"""(\bvalue\s*=\s*)(["'])(.*?)\2""", re.IGNORECASE | re.DOTALL)
+_SESSION_ID = re.compile(r"(jsessionid=)[\w.-]+", re.IGNORECASE)
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+# 携帯電話（ハイフンなしを含む）と、ハイフン区切りの固定電話
+_PHONE = re.compile(r"(?<!\d)(?:0[789]0-?\d{4}-?\d{4}|0\d{1,4}-\d{1,4}-\d{4})(?!\d)")
+
+
+def scrub_html(html):
+    """
+    ログインID・パスワード・電話番号（環境変数の値）、FIXTURE_SCRUB_WORDS の文字列（氏名など）、
+    パスワード・hidden入力欄の値、セッションID、電話番号・メールアドレスの形式の文字列を伏せる
+    """
+    words = [os.getenv(name, "") for name in ("USER_ID", "PASSWORD", "PHONE_NUMBER")]
+    words += os.getenv("FIXTURE_SCRUB_WORDS", "").split(",")
+    for word in sorted({word.strip() for word in words if word.strip()}, key=len, reverse=True):
+        html = html.replace(word, SCRUBBED)
+
+    def scrub_input(match):
+        tag = match.group(0)
+        if not _INPUT_TYPE.search(tag):
+            return tag
+        return _INPUT_VALUE.sub(lambda value: f"{value.group(1)}{value.group(2)}{value.group(2)}", tag)
+
+    html = _INPUT_TAG.sub(scrub_input, html)
+    html = _SESSION_ID.sub(rf"\g<1>{SCRUBBED}", html)
+    html = _EMAIL.sub("user@example.com", html)
+    return _PHONE.sub("000-0000-0000", html)
+
+
+def page_kind(root):
+    """ページの種類（search_result / reservations / login / search_form / other）"""
+    if has_status_area(root):
+        return "search_result"
+    if root.find("table", class_="striped01") is not None:
+        return "reservations"
+    if any(node.get("type") == "password" for node in root.find_all("input")):
+        return "login"
+    if find_form_with(root, "keyword") is not None:
+        return "search_form"
+    return "other"
+
+
+def record_page(html, root=None, directory=None):
+    """
+    FIXTURE_RECORD_DIR（または directory）が指定されている場合、伏せ字にしたページを保存してパスを返す。
+    ファイル名は <種類>_<内容のハッシュ>.html とし、同じ内容のページは保存し直さない。
+    """
+    directory = directory or os.getenv("FIXTURE_RECORD_DIR")
+    if not directory:
+        return None
+    html = scrub_html(html)
+    kind = page_kind(root if root is not None else parse_html(html))
+    path = os.path.join(directory, f"{kind}_{hashlib.sha1(html.encode('utf-8')).hexdigest()[:12]}.html")
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(html)
+    return path
+
+
+def iter_fixtures(directory=DEFAULT_DIR):
+    """保存済みのページの (パス, HTML) をファイル名順に返す"""
+    if not os.path.isdir(directory):
+        return
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".html"):
+            path = os.path.join(directory, name)
+            with open(path, encoding="utf-8") as file:
+                yield path, file.read()
+
+
+def extract_all(html):
+    """ページを解析処理に通した結果（正解との比較用）"""
+    root = parse_html(html)
+    return {
+        "kind": page_kind(root),
+        "has_status_area": has_status_area(root),
+        "slots": [asdict(slot) for slot in extract_slots(root)],
+        "reservation_rows": len(find_reservation_rows(root)),
+        "reservations": [
+            dict(reservation.as_dict(), start_datetime=(
+                reservation.start_datetime.isoformat() if reservation.start_datetime else None))
+            for reservation in extract_reservations(root)
+        ],
+    }
+
+
+def golden_path(path):
+    return os.path.splitext(path)[0] + ".json"
+
+
+def diff_results(expected, actual):
+    """正解と解析結果の違いの説明のリスト"""
+    differences = []
+    for key in sorted(set(expected) | set(actual)):
+        if expected.get(key) == actual.get(key):
+            continue
+        if isinstance(expected.get(key), list) and isinstance(actual.get(key), list):
+            before, after = expected[key], actual[key]
+            if len(before) != len(after):
+                differences.append(f"{key}: {len(before)}件 → {len(after)}件")
+            for i, (old, new) in enumerate(zip(before, after)):
+                if old != new:
+                    differences.append(f"{key}[{i}]: {old} → {new}")
+                    break
+        else:
+            differences.append(f"{key}: {expected.get(key)} → {actual.get(key)}")
+    return differences
+
+
+def check_fixtures(directory=DEFAULT_DIR, update=False):
+    """
+    保存済みのページを解析し、正解と比較する（update=True の場合は正解を保存し直す）。
+    違いのあったページ数を返す（ページが1つもない場合は、確認できていないため1を返す）。
+    """
+    checked = failed = 0
+    for path, html in iter_fixtures(directory):
+        actual = extract_all(html)
+        expected_path = golden_path(path)
+        if update:
+            with open(expected_path, "w", encoding="utf-8") as file:
+                json.dump(actual, file, ensure_ascii=False, indent=2)
+                file.write("\n")
+        elif not os.path.exists(expected_path):
+            logger.error(f"{path}: 正解がありません（update で作成してください）", extra={"fixture": path, "outcome": "missing"})
+            failed += 1
+        else:
+            with open(expected_path, encoding="utf-8") as file:
+                differences = diff_results(json.load(file), actual)
+            if differences:
+                failed += 1
+                logger.error(f"{path}: 正解と異なります\n    " + "\n    ".join(differences),
+                             extra={"fixture": path, "outcome": "mismatch", "differences": differences})
+        checked += 1
+    if checked == 0:
+        logger.error(f"{directory}にフィクスチャがありません（record-fake で作成してください）",
+                     extra={"fixture": directory, "outcome": "empty"})
+        return 1
+    logger.info(f"{checked}ページ中{failed}ページが正解と異なります" if not update else f"{checked}ページの正解を保存しました")
+    return failed
+
+
+def benchmark_fixtures(directory=DEFAULT_DIR, iterations=100):
+    """ページの種類ごとに、HTMLの解析と取り出しの1ページあたりの所要時間を計測する"""
+    pages = {}
+    for path, html in iter_fixtures(directory):
+        pages.setdefault(os.path.basename(path).rsplit("_", 1)[0], []).append(html)
+
+    results = []
+    for kind, htmls in sorted(pages.items()):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            for html in htmls:
+                root = parse_html(html)
+                extract_slots(root)
+                extract_reservations(root)
+        elapsed = time.perf_counter() - started
+        count = iterations * len(htmls)
+        results.append({"name": kind, "pages": len(htmls), "ms_per_op": elapsed / count * 1000, "ops_per_sec": count / elapsed})
+
+    # 予約履歴の日時の解析
+    date_strings = [reservation["start_time"] for htmls in pages.values() for html in htmls
+                    for reservation in extract_all(html)["reservations"]] or ["2025/04/26(土) 18:00"]
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for date_string in date_strings:
+            parse_datetime_with_weekday(date_string)
+    elapsed = time.perf_counter() - started
+    count = iterations * len(date_strings)
+    results.append({"name": "parse_datetime_with_weekday", "pages": len(date_strings),
+                    "ms_per_op": elapsed / count * 1000, "ops_per_sec": count / elapsed})
+
+    lines = [f"{'name':<28} {'pages':>6} {'ms/op':>10} {'ops/sec':>12}"]
+    for result in results:
+        lines.append(f"{result['name']:<28} {result['pages']:>6} {result['ms_per_op']:>10.3f} {result['ops_per_sec']:>12.0f}")
+    logger.info("解析処理の計測結果\n" + "\n".join(lines), extra={"results": results})
+    return results
+
+
+def record_fake_fixtures(directory=DEFAULT_DIR):
+    """テスト用サーバーにHTTPバックエンドでログイン・検索・予約履歴取得を行い、読み込んだページを記録する"""
+    # テスト用サーバーとHTTPバックエンド（requests）は使用時のみimport
+    from fun_navi_fake_server import FakeFunNaviConfig, start_fake_server
+    from fun_navi_http import HttpBackend
+
+    config = FakeFunNaviConfig(now=FAKE_NOW)
+    server, login_url = start_fake_server(config)
+    overrides = {"LOGIN_URL": login_url, "SESSION_CACHE": "false", "FIXTURE_RECORD_DIR": directory,
+                 "USER_ID": "fixture-user", "PASSWORD": "fixture-password"}
+    saved = {name: os.environ.get(name) for name in overrides}
+    os.environ.update(overrides)
+    backend = HttpBackend(logger)
+    try:
+        backend.login()
+        for i, facility_name in enumerate(config.facilities):
+            backend.search_slots(facility_name, FAKE_NOW + timedelta(days=30 + i))
+        # 抽選受付の月（2ヶ月後）の抽選ボタンのページ
+        backend.search_slots(config.facilities[0], FAKE_NOW + timedelta(days=61))
+        backend.fetch_reservations(FAKE_NOW)
+    finally:
+        backend.quit()
+        server.shutdown()
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ページのフィクスチャの記録・解析結果の確認・性能計測")
+    parser.add_argument("command", choices=["check", "update", "bench", "record-fake"])
+    parser.add_argument("--dir", default=DEFAULT_DIR, help="フィクスチャの保存先")
+    parser.add_argument("--iterations", type=int, default=100, help="bench の繰り返し回数")
+    args = parser.parse_args()
+
+    # LOG_LEVEL などを .env で指定している場合に備えて読み込む
+    from dotenv import load_dotenv
+    load_dotenv(override=True)
+    configure_logging()
+
+    if args.command == "record-fake":
+        record_fake_fixtures(args.dir)
+        logger.info(f"テスト用サーバーのページを{args.dir}に記録しました")
+    elif args.command == "bench":
+        benchmark_fixtures(args.dir, args.iterations)
+    else:
+        sys.exit(1 if check_fixtures(args.dir, update=args.command == "update") else 0)
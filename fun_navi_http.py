@@ -0,0 +1,264 @@
+from fun_navi_common import get_credentials
+from fun_navi_session import (
+    SessionExpiredError, load_session, save_session, clear_session, get_session_check_url
+)
+from fun_navi_parser import (
+    parse_html, find_form_with, form_fields, find_link,
+    has_status_area, extract_slots, extract_reservations, upcoming_reservations, is_page_synced
+)
+from fun_navi_trace import span
+from fun_navi_fixtures import record_page
+from datetime import datetime
+from urllib.parse import urljoin, urlparse
+from requests.adapters import HTTPAdapter
+import os
+import requests
+
+DEFAULT_USER_AGENT = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
+)
+
+
+class HttpBackendError(Exception):
+    """HTTPバックエンドでは処理できないページ（JavaScript必須など）"""
+
+
+class HttpBackend:
+    """
+    ブラウザを使わずにHTTPでページを取得・解析するバックエンド。
+    keep-aliveの接続プールを使い回すため、1クエリあたりの待ち時間とメモリが小さい。
+    """
+    name = "http"
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.timeout = float(os.getenv("HTTP_TIMEOUT", "10"))
+        pool_size = int(os.getenv("HTTP_POOL_SIZE", "4"))
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["User-Agent"] = os.getenv("HTTP_USER_AGENT", DEFAULT_USER_AGENT)
+
+        self.logged_in = False
+        # 現在のページと、検索フォームのあるページ
+        self.url = None
+        self.page = None
+        self.search_url = None
+        self.search_page = None
+
+    def _load(self, method, url, data=None):
+        with span("http_request", method=method, path=urlparse(url).path):
+            if method == "GET":
+                response = self.session.get(url, params=data, timeout=self.timeout)
+            else:
+                response = self.session.post(url, data=data, timeout=self.timeout)
+        response.raise_for_status()
+        # 文字コードの指定がない場合は内容から推定（Shift_JIS対策）
+        if not response.encoding or response.encoding.lower() == "iso-8859-1":
+            response.encoding = response.apparent_encoding
+        self.url = response.url
+        with span("http_parse"):
+            self.page = parse_html(response.text)
+        record_page(response.text, self.page)
+        # ログイン後にパスワード入力欄が表示された場合はセッション切れ
+        if self.logged_in and any(node.get("type") == "password" for node in self.page.find_all("input")):
+            raise SessionExpiredError(f"ログイン画面に戻されました: {self.url}")
+        return self.page
+
+    def _submit(self, base_url, form, values, submit=None):
+        action = urljoin(base_url, form.get("action") or base_url)
+        method = "POST" if form.get("method", "get").lower() == "post" else "GET"
+        data = form_fields(form)
+        data.update(values)
+        if submit is not None and submit.get("name"):
+            data[submit.get("name")] = submit.get("value", "")
+        return self._load(method, action, data)
+
+    def _follow(self, href_contains):
+        link = find_link(self.page, href_contains)
+        if link is None:
+            return None
+        href = link.get("href", "")
+        if href.lower().startswith("javascript:"):
+            raise HttpBackendError(f"JavaScriptによる遷移には対応していません: {href}")
+        return self._load("GET", urljoin(self.url, href))
+
+    def _restore_session(self):
+        """保存済みのcookieを設定し、1回のリクエストで有効性を確認する"""
+        session = load_session(os.getenv("USER_ID"))
+        if not session:
+            return False
+
+        try:
+            for cookie in session["cookies"]:
+                self.session.cookies.set(
+                    cookie["name"], cookie["value"],
+                    domain=cookie.get("domain", ""), path=cookie.get("path", "/"),
+                )
+            page = self._load("GET", get_session_check_url(session))
+            if find_form_with(page, "keyword") is None:
+                raise SessionExpiredError("検索フォームが表示されません")
+        except Exception as e:
+            self.logger.info(f"保存済みのセッションが無効なため、ログインし直します: {e}")
+            clear_session(os.getenv("USER_ID"))
+            self.session.cookies.clear()
+            return False
+
+        self.search_url, self.search_page = self.url, self.page
+        self.logged_in = True
+        self.logger.info("保存済みのセッションでログインしました")
+        return True
+
+    def _save_session(self):
+        cookies = [
+            {"name": cookie.name, "value": cookie.value, "domain": cookie.domain,
+             "path": cookie.path, "secure": bool(cookie.secure)}
+            for cookie in self.session.cookies
+        ]
+        save_session(os.getenv("USER_ID"), cookies, self.url)
+
+    def _with_relogin(self, method, *args):
+        """セッション切れを検出した場合、ログインし直して1回だけ再実行する"""
+        try:
+            return method(*args)
+        except SessionExpiredError as e:
+            self.logger.warning(f"セッションの有効期限が切れたため、ログインし直して再実行します: {e}")
+            clear_session(os.getenv("USER_ID"))
+            self.session.cookies.clear()
+            self.login()
+            return method(*args)
+
+    def login(self):
+        self.logged_in = False
+        if self._restore_session():
+            return
+
+        login_url = os.getenv("LOGIN_URL", "https://fun-navi.net/frpc010g.jsp")
+        user_id, password = get_credentials()
+
+        try:
+            page = self._load("GET", login_url)
+            form = find_form_with(page, "a11y-01")
+            if form is None:
+                raise HttpBackendError("ログインフォームが見つかりません")
+
+            values = {
+                form.find(id="a11y-01").get("name"): user_id,
+                form.find(id="a11y-02").get("name"): password,
+            }
+            submit = next(
+                (node for node in form.find_all("input")
+                 if node.get("type") == "submit" and node.get("value") == "ログイン"),
+                None,
+            )
+            self._submit(self.url, form, values, submit)
+            if "FRPC010G_LoginAction.do" not in self.url:
+                raise HttpBackendError(f"ログイン後のページが想定と異なります: {self.url}")
+
+            self.search_url, self.search_page = self.url, self.page
+            self.logged_in = True
+            self.logger.info("ログイン成功")
+        except Exception as e:
+            self.logger.error(f"ログインに失敗しました: {e}")
+            raise
+
+        # 次回以降のためにセッションを保存
+        self._save_session()
+
+    def search_availability(self, facility_name, date):
+        """指定した施設名と日付で空き状況を検索"""
+        if isinstance(date, str):
+            date = datetime.strptime(date, "%Y/%m/%d")
+
+        try:
+            available = any(slot.available for slot in self.search_slots(facility_name, date))
+            if available:
+                self.logger.info(f"施設: {facility_name}, 日付: {date.strftime('%Y/%m/%d')} は予約可能")
+            else:
+                self.logger.info(f"施設: {facility_name}, 日付: {date.strftime('%Y/%m/%d')} は空きなし")
+            return available
+
+        except (HttpBackendError, SessionExpiredError):
+            raise
+        except Exception as e:
+            # 「空きなし」と区別できるよう、エラーはそのまま送出する（再試行は呼び出し元で行う）
+            self.logger.error(f"施設: {facility_name}, 日付: {date.strftime('%Y/%m/%d')} の検索中にエラーが発生: {str(e)}")
+            raise
+
+    def search_slots(self, facility_name, date):
+        """指定した施設名と日付で検索し、時間帯ごとの空き状況を返す"""
+        return self._with_relogin(self._search_slots, facility_name, date)
+
+    def _search_slots(self, facility_name, date):
+        if isinstance(date, str):
+            date = datetime.strptime(date, "%Y/%m/%d")
+
+        # 直前のページに検索フォームがあればそれを使う
+        base_url, page = self.url, self.page
+        form = find_form_with(page, "keyword") if page is not None else None
+        if form is None:
+            base_url, page = self.search_url, self.search_page
+            form = find_form_with(page, "keyword")
+        if form is None:
+            raise HttpBackendError("検索フォームが見つかりません")
+
+        values = {
+            form.find(id="keyword").get("name"): facility_name,
+            form.find(id="useDateArea").get("name"): date.strftime("%Y/%m/%d"),
+        }
+        page = self._submit(base_url, form, values, form.find(id="search"))
+        if not has_status_area(page):
+            raise HttpBackendError("検索結果を取得できません（JavaScriptによる検索の可能性）")
+
+        return extract_slots(page)
+
+    def fetch_reservations(self, now=None, known=None):
+        """
+        予約履歴ページに移動し、先日付の予約を返す。
+        known（{予約番号: ステータス}）を渡すと、全て取得済みか過去の予約のページで読み込みを終了する。
+        known を渡さない場合（全件取得）は、途中までの結果で削除された予約を判定しないよう、エラーをそのまま送出する。
+        """
+        return self._with_relogin(self._fetch_reservations, now, known)
+
+    def _fetch_reservations(self, now=None, known=None):
+        if now is None:
+            now = datetime.now()
+        if self.page is None or find_link(self.page, "do_ReserveInfoListGeneral") is None:
+            self.url, self.page = self.search_url, self.search_page
+        if self._follow("do_ReserveInfoListGeneral") is None:
+            raise HttpBackendError("予約履歴ページへのリンクが見つかりません")
+        self.logger.info("ページ遷移に成功しました。")
+
+        existing_reservations = []
+        try:
+            while True:
+                reservations = extract_reservations(self.page)
+                if not reservations:
+                    self.logger.info("予約履歴が見つかりませんでした。")
+                    break
+
+                existing_reservations.extend(upcoming_reservations(reservations, now))
+
+                if known is not None and is_page_synced(reservations, known, now):
+                    self.logger.info("以降の予約履歴は取得済みのため、読み込みを終了します。")
+                    break
+
+                if self._follow("do_NextPage") is None:
+                    self.logger.info("全ての予約履歴を読み込みました。")
+                    break
+                self.logger.info("次のページへ遷移します...")
+
+        except (HttpBackendError, SessionExpiredError):
+            raise
+        except Exception as e:
+            self.logger.error(f"予約履歴の取得中にエラーが発生しました: {e}")
+            if known is None:
+                raise
+
+        return existing_reservations
+
+    def quit(self):
+        self.session.close()
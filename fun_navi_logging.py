@@ -0,0 +1,147 @@
+"""
+ログの出力設定。
+ログはキュー（QueueHandler）に入れるだけで呼び出し元に戻り、別スレッド（QueueListener）が
+コンソール（テキスト）とファイル（JSON 1行、サイズでローテーション）に書き込む。
+ファイルは常駐サービス・各スクリプト・子プロセスで共有するため、書き込みと切り替えをファイルロックで排他する。
+logger.info("...", extra={"facility": ..., "date": ..., "stage": ..., "duration_ms": ..., "outcome": ...})
+のように extra で渡した項目は、JSONの項目として出力する。
+"""
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Windows ではプロセス間の排他を行わない
+    fcntl = None
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# LogRecord の標準の属性（これ以外を extra の項目として出力する）
+_STANDARD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener = None
+_queue_handler = None
+_configured_pid = None
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """1件のログを1行のJSONにする"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "process": record.process,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SharedRotatingFileHandler(RotatingFileHandler):
+    """
+    複数のプロセスから同じファイルに書き込めるRotatingFileHandler。
+    書き込みと切り替えを <ファイル名>.lock のロックで排他し、他のプロセスが切り替えた場合は新しいファイルを開き直す。
+    """
+
+    def __init__(self, filename, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.lock_file = None
+
+    def _lock(self):
+        if fcntl is None:
+            return
+        if self.lock_file is None:
+            self.lock_file = open(self.baseFilename + ".lock", "a")
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+
+    def _unlock(self):
+        if fcntl is not None and self.lock_file is not None:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def _reopen_if_rotated(self):
+        if self.stream is None:
+            return
+        try:
+            rotated = os.stat(self.baseFilename).st_ino != os.fstat(self.stream.fileno()).st_ino
+        except FileNotFoundError:
+            rotated = True
+        if rotated:
+            self.stream.close()
+            self.stream = None
+
+    def emit(self, record):
+        try:
+            self._lock()
+            try:
+                self._reopen_if_rotated()
+                if self.shouldRollover(record):
+                    self.doRollover()
+                logging.FileHandler.emit(self, record)
+            finally:
+                self._unlock()
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        super().close()
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = None
+
+
+def _start_listener():
+    global _listener, _queue_handler, _configured_pid
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO))
+    # fork したプロセスでは、元のプロセスのキュー（書き込むスレッドがない）を外して作り直す
+    if _queue_handler is not None:
+        root.removeHandler(_queue_handler)
+
+    file_handler = SharedRotatingFileHandler(
+        os.getenv("LOG_FILE", "fun_navi_log.log"),
+        maxBytes=int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+        backupCount=int(os.getenv("LOG_BACKUP_COUNT", "5")),
+        encoding="utf-8",
+    )
+    file_handler.setFormatter(JsonFormatter())
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = QueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    _listener = QueueListener(log_queue, console_handler, file_handler)
+    _listener.start()
+    if _configured_pid is None:
+        atexit.register(stop_logging)
+    _configured_pid = os.getpid()
+
+
+def configure_logging():
+    """ログの出力を設定する（2回目以降の呼び出しでは何もしない）"""
+    with _lock:
+        if _configured_pid != os.getpid():
+            _start_listener()
+    return logging.getLogger("fun_navi")
+
+
+def stop_logging():
+    """キューに残っているログを書き込んで、書き込み用のスレッドを終了する（終了時に自動で呼び出す）"""
+    global _configured_pid
+    with _lock:
+        if _listener is not None and _configured_pid == os.getpid():
+            _listener.stop()
+            _configured_pid = -1
@@ -0,0 +1,45 @@
+import os
+import threading
+import psutil
+
+
+def process_tree_memory_mb(pid=None):
+    """指定したプロセスと子孫プロセス（chromedriver・Chrome）のメモリ使用量の合計（MB）"""
+    try:
+        process = psutil.Process(pid or os.getpid())
+        processes = [process] + process.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return 0.0
+
+    total = 0
+    for child in processes:
+        try:
+            total += child.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return total / (1024 * 1024)
+
+
+class MemorySampler:
+    """with内で、このプロセスとブラウザを含む子孫プロセスのメモリ使用量の最大値を記録する"""
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, process_tree_memory_mb())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, process_tree_memory_mb())
+        return False
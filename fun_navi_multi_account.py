@@ -0,0 +1,155 @@
+"""
+複数アカウントの抽選申し込みを、アカウントごとに別のプロセス（ブラウザ・ログインセッション）で並行に行う。
+アカウントは PRR_ACCOUNTS_FILE（JSON）に記載する。
+
+    [
+        {"name": "home", "user_id": "...", "password": "...", "phone_number": "090..."},
+        {"name": "neighbor", "user_id": "...", "password": "...", "phone_number": "080...",
+         "facility_names": ["SEA／E棟17階_PARTY ROOM SKY_夜"]}
+    ]
+
+facility_names を省略したアカウントは PRR_FACILITY_NAMES の施設に申し込む。
+結果はアカウントごとの reservation_results_<name>.csv と、全アカウントをまとめた reservation_summary.csv に出力する。
+"""
+from fun_navi_common import (
+    configure_logging, initialize_driver, login, apply_for_facility_lottery, with_relogin,
+    get_dates_range, get_lottery_period, COMPLETED_LOTTERY_STATUSES
+)
+from fun_navi_checkpoint import Checkpoint, iter_checkpoint
+from fun_navi_pool import MAX_WORKERS_LIMIT
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+import argparse
+import csv
+import json
+import os
+import re
+
+RESULT_FIELDS = ["facility_name", "date", "reservation_number", "status"]
+
+
+def load_accounts(path):
+    """アカウントの一覧を読み込む（name・user_id・password は必須）"""
+    with open(path, encoding="utf-8") as file:
+        accounts = json.load(file)
+    names = set()
+    for account in accounts:
+        missing = [key for key in ("name", "user_id", "password") if not account.get(key)]
+        if missing:
+            raise ValueError(f"{path}のアカウントに {', '.join(missing)} がありません: {account.get('name', '')}")
+        if not re.fullmatch(r"[\w.-]+", account["name"]):
+            raise ValueError(f"アカウント名 {account['name']} はファイル名に使えない文字を含んでいます")
+        if account["name"] in names:
+            raise ValueError(f"{path}のアカウント名 {account['name']} が重複しています")
+        names.add(account["name"])
+    return accounts
+
+
+def account_files(name):
+    return f"reservation_checkpoint_{name}.jsonl", f"reservation_results_{name}.csv"
+
+
+def run_account(account, resume=False):
+    """
+    1つのアカウントでログインし、抽選に申し込む（ワーカープロセスで実行）。
+    ログイン・申し込みの処理は環境変数の認証情報を使うため、このプロセスの環境変数をアカウントのものに置き換える。
+    """
+    logger = configure_logging()
+    name = account["name"]
+    os.environ["USER_ID"] = account["user_id"]
+    os.environ["PASSWORD"] = account["password"]
+    if account.get("phone_number"):
+        os.environ["PHONE_NUMBER"] = account["phone_number"]
+    # 使い回すプロファイルに他のアカウントのcookieが残らないよう、アカウントごとに分ける
+    if os.getenv("CHROME_PROFILE_DIR"):
+        os.environ["CHROME_PROFILE_DIR"] = os.path.join(os.getenv("CHROME_PROFILE_DIR"), name)
+
+    facility_names = account.get("facility_names") or os.getenv("PRR_FACILITY_NAMES", "").split(",")
+    facility_names = [facility_name.strip() for facility_name in facility_names if facility_name.strip()]
+    checkpoint_file, result_file = account_files(name)
+
+    completed = set()
+    if resume:
+        completed = {
+            (record["facility_name"], record["date"]) for record in iter_checkpoint(checkpoint_file)
+            if record["status"] in COMPLETED_LOTTERY_STATUSES
+        }
+
+    start_date, end_date = get_lottery_period(datetime.now())
+    dates = get_dates_range(start_date, end_date, "PRR")
+
+    driver = initialize_driver()
+    checkpoint = Checkpoint(checkpoint_file, resume=resume)
+    try:
+        login(driver, logger)
+        logger.info(f"アカウント {name}: ログインしました。{len(dates)}日 × {len(facility_names)}施設に申し込みます")
+        for date in dates:
+            for facility_name in facility_names:
+                if (facility_name, date) in completed:
+                    continue
+                reservation_data = with_relogin(driver, logger, apply_for_facility_lottery, facility_name, date)
+                checkpoint.append(reservation_data)
+    finally:
+        driver.quit()
+        checkpoint.close()
+
+        # 記録した申し込み結果を1行ずつ読み込んでCSVに出力（同じ施設・日付は後の結果を使う）
+        latest = {}
+        for record in iter_checkpoint(checkpoint_file):
+            latest[(record["facility_name"], record["date"])] = record
+        with open(result_file, "w", encoding="utf-8", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=RESULT_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(latest.values())
+        logger.info(f"アカウント {name}: 申し込み結果を{result_file}に出力しました")
+
+    return name, result_file
+
+
+def write_summary(accounts, path="reservation_summary.csv"):
+    """アカウントごとのCSVを1つにまとめ、アカウントごとのステータス別の件数を返す"""
+    counts = {}
+    with open(path, "w", encoding="utf-8", newline="") as summary_file:
+        writer = csv.DictWriter(summary_file, fieldnames=["account"] + RESULT_FIELDS)
+        writer.writeheader()
+        for account in accounts:
+            _, result_file = account_files(account["name"])
+            if not os.path.exists(result_file):
+                continue
+            account_counts = counts.setdefault(account["name"], {})
+            with open(result_file, encoding="utf-8", newline="") as file:
+                for row in csv.DictReader(file):
+                    writer.writerow(dict(row, account=account["name"]))
+                    status = row["status"].split(":")[0]
+                    account_counts[status] = account_counts.get(status, 0) + 1
+    return counts
+
+
+def main():
+    logger = configure_logging()
+    parser = argparse.ArgumentParser(description="複数アカウントの抽選申し込み")
+    parser.add_argument("--resume", action="store_true", help="前回中断した申し込みの続きから再開する")
+    args = parser.parse_args()
+
+    accounts = load_accounts(os.getenv("PRR_ACCOUNTS_FILE", "accounts.json"))
+    concurrency = int(os.getenv("PRR_ACCOUNT_CONCURRENCY", "2"))
+    # サイトへの負荷とマシンのメモリを考慮し、同時に起動するブラウザ数を制限する
+    workers = max(1, min(concurrency, MAX_WORKERS_LIMIT, len(accounts)))
+    logger.info(f"{len(accounts)}アカウントを{workers}プロセスで並行に申し込みます")
+
+    # アカウントの環境変数が次のアカウントに残らないよう、1アカウントごとに新しいプロセスを使う
+    with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=1) as executor:
+        futures = {executor.submit(run_account, account, args.resume): account["name"] for account in accounts}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"アカウント {futures[future]} の申し込み中にエラーが発生: {e}")
+
+    for name, account_counts in write_summary(accounts).items():
+        logger.info(f"アカウント {name}: " + ", ".join(f"{status} {count}件" for status, count in account_counts.items()))
+    logger.info("全アカウントの申し込み結果をreservation_summary.csvに出力しました")
+
+
+if __name__ == "__main__":
+    main()
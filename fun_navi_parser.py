@@ -0,0 +1,281 @@
+from html.parser import HTMLParser
+from dataclasses import dataclass
+from datetime import datetime
+import logging
+import re
+
+# 終了タグを持たない要素
+VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+}
+
+# 開始タグが来たときに暗黙的に閉じられる要素
+IMPLICIT_CLOSE = {
+    "td": {"td", "th"},
+    "th": {"td", "th"},
+    "tr": {"td", "th", "tr"},
+    "li": {"li"},
+    "option": {"option"},
+    "p": {"p"},
+}
+
+_WHITESPACE = re.compile(r"\s+")
+# 時間帯ボタンのクラス（time-rsv-available-btn, time-drawing-available-btn など）
+_SLOT_BUTTON_CLASS = re.compile(r"^time-(.+)-btn$")
+# ボタンのクラスから空き状況への変換
+SLOT_STATUSES = {
+    "rsv-available": "available",
+    "drawing-available": "drawing",
+}
+_HEADINGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+
+
+@dataclass
+class Reservation:
+    """予約履歴の1行"""
+    facility_name: str
+    start_time: str
+    end_time: str
+    reservation_number: str
+    status: str
+    start_datetime: datetime = None
+
+    def as_dict(self):
+        """CSV出力用の辞書"""
+        return {
+            "facility_name": self.facility_name,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "reservation_number": self.reservation_number,
+            "status": self.status,
+        }
+
+
+@dataclass
+class SlotAvailability:
+    """検索結果の時間帯ごとの空き状況"""
+    facility_name: str
+    slot: str
+    status: str
+
+    @property
+    def available(self):
+        return self.status == "available"
+
+
+class Node:
+    """HTMLの要素（Seleniumを使わずにページを解析するための軽量なDOM）"""
+    __slots__ = ("tag", "attrs", "children", "parent")
+
+    def __init__(self, tag, attrs=None, parent=None):
+        self.tag = tag
+        self.attrs = attrs or {}
+        self.children = []
+        self.parent = parent
+
+    def get(self, name, default=None):
+        return self.attrs.get(name, default)
+
+    @property
+    def classes(self):
+        return self.attrs.get("class", "").split()
+
+    @property
+    def text(self):
+        """要素内のテキスト（空白は1つにまとめる）"""
+        parts = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                parts.append(node)
+            else:
+                stack.extend(reversed(node.children))
+        return _WHITESPACE.sub(" ", "".join(parts)).strip()
+
+    def iter(self):
+        """自身と子孫の要素を文書順に返す"""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(child for child in reversed(node.children) if isinstance(child, Node))
+
+    def find_all(self, tag=None, class_=None, id=None):
+        return [
+            node for node in self.iter()
+            if (tag is None or node.tag == tag)
+            and (class_ is None or class_ in node.classes)
+            and (id is None or node.attrs.get("id") == id)
+        ]
+
+    def find(self, tag=None, class_=None, id=None):
+        for node in self.find_all(tag, class_, id):
+            return node
+        return None
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node("#document")
+        self.current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        closes = IMPLICIT_CLOSE.get(tag)
+        if closes:
+            while self.current.tag in closes:
+                self.current = self.current.parent
+        node = Node(tag, {name: value or "" for name, value in attrs}, self.current)
+        self.current.children.append(node)
+        if tag not in VOID_ELEMENTS:
+            self.current = node
+
+    def handle_startendtag(self, tag, attrs):
+        node = Node(tag, {name: value or "" for name, value in attrs}, self.current)
+        self.current.children.append(node)
+
+    def handle_endtag(self, tag):
+        node = self.current
+        while node is not self.root and node.tag != tag:
+            node = node.parent
+        if node is not self.root:
+            self.current = node.parent
+
+    def handle_data(self, data):
+        self.current.children.append(data)
+
+
+def parse_html(html):
+    """HTML文字列を解析してルート要素を返す"""
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+
+# フォーム関連
+def find_form_with(root, element_id):
+    """指定したIDの要素を含むフォームを返す"""
+    for form in root.find_all("form"):
+        if form.find(id=element_id) is not None:
+            return form
+    return None
+
+
+def form_fields(form):
+    """フォーム送信時に送られる値（送信ボタンを除く）を返す"""
+    fields = {}
+    for node in form.iter():
+        name = node.get("name")
+        if not name:
+            continue
+        if node.tag == "input":
+            input_type = node.get("type", "text").lower()
+            if input_type in ("submit", "button", "image", "reset", "file"):
+                continue
+            if input_type in ("checkbox", "radio") and "checked" not in node.attrs:
+                continue
+            fields[name] = node.get("value", "on" if input_type in ("checkbox", "radio") else "")
+        elif node.tag == "select":
+            options = node.find_all("option")
+            selected = [option for option in options if "selected" in option.attrs] or options[:1]
+            if selected:
+                fields[name] = selected[0].get("value", selected[0].text)
+        elif node.tag == "textarea":
+            fields[name] = node.text
+    return fields
+
+
+def find_link(root, href_contains):
+    """hrefに指定文字列を含むリンクを返す"""
+    for link in root.find_all("a"):
+        if href_contains in link.get("href", ""):
+            return link
+    return None
+
+
+# 空き状況関連
+def has_status_area(root):
+    return root.find(class_="status-area47") is not None
+
+
+def extract_slots(root):
+    """
+    検索結果ページから時間帯ごとの空き状況を1回の走査で取り出す。
+    施設名は、各ボタンより前にある直近の見出し（h1〜h6）のテキストとする。
+    """
+    slots = []
+    heading = ""
+    for node in root.iter():
+        if node.tag in _HEADINGS:
+            heading = node.text
+            continue
+        for css_class in node.classes:
+            match = _SLOT_BUTTON_CLASS.match(css_class)
+            if match:
+                slot = node.text or node.get("value", "") or node.get("title", "")
+                slots.append(SlotAvailability(heading, slot, SLOT_STATUSES.get(match.group(1), match.group(1))))
+                break
+    return slots
+
+
+# 予約履歴関連
+def find_reservation_rows(root):
+    """予約履歴テーブル（table.striped01）の各行のセルのテキストを返す"""
+    rows = []
+    for table in root.find_all("table", class_="striped01"):
+        for tbody in table.children:
+            if not isinstance(tbody, Node) or tbody.tag != "tbody":
+                continue
+            for tr in tbody.children:
+                if isinstance(tr, Node) and tr.tag == "tr":
+                    rows.append([td.text for td in tr.children if isinstance(td, Node) and td.tag == "td"])
+    return rows
+
+
+def extract_reservations(root):
+    """予約履歴ページの全行を Reservation として返す（列が足りない行は除く）"""
+    reservations = []
+    for columns in find_reservation_rows(root):
+        if len(columns) < 5:
+            continue
+        start_time = columns[0].strip()
+        reservations.append(Reservation(
+            facility_name=columns[2].strip(),
+            start_time=start_time,
+            end_time=columns[1].strip(),
+            reservation_number=columns[3].strip(),
+            status=columns[4].strip(),
+            start_datetime=parse_datetime_with_weekday(start_time),
+        ))
+    return reservations
+
+
+def upcoming_reservations(reservations, now):
+    """先日付の予約のみをCSV出力用の辞書で返す"""
+    return [
+        reservation.as_dict() for reservation in reservations
+        if reservation.start_datetime and reservation.start_datetime > now
+    ]
+
+
+def is_page_synced(reservations, known, now):
+    """ページ内の予約が全て取得済み（ステータスも同じ）か過去の予約かどうか"""
+    return all(
+        (reservation.start_datetime is not None and reservation.start_datetime <= now)
+        or known.get(reservation.reservation_number) == reservation.status
+        for reservation in reservations
+    )
+
+
+# 日付フォーマット関数
+def parse_datetime_with_weekday(date_str):
+    try:
+        date_str_cleaned = date_str.split("(")[0].strip() + " " + date_str.split(" ")[1].strip()
+        return datetime.strptime(date_str_cleaned, "%Y/%m/%d %H:%M")
+    except ValueError as e:
+        logging.error(f"日付のフォーマットエラー: {date_str} - {e}")
+        return None
+
@@ -0,0 +1,60 @@
+from fun_navi_backend import search_slots_or_none
+from fun_navi_engine import create_resilient_backend
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+# 同時に起動するWebDriverセッション数の上限（サイトへの負荷対策）
+MAX_WORKERS_LIMIT = int(os.getenv("PR_MAX_WORKERS_LIMIT", "4"))
+
+
+def split_tasks(tasks, workers):
+    """
+    タスクを連続したブロックに分割する。
+    連続したブロックにすることで、各セッション内で施設名・日付の再入力を減らす。
+    """
+    chunk_size, remainder = divmod(len(tasks), workers)
+    chunks = []
+    start = 0
+    for i in range(workers):
+        end = start + chunk_size + (1 if i < remainder else 0)
+        if start < end:
+            chunks.append(tasks[start:end])
+        start = end
+    return chunks
+
+
+def _search_worker(logger, chunk, on_result=None):
+    """独立したセッションでログインし、割り当てられた(施設名, 日付)を順に検索"""
+    backend = create_resilient_backend(logger)
+    results = []
+    try:
+        backend.login()
+        for facility_name, date in chunk:
+            logger.debug(f"施設: {facility_name}, 日付: {date} を検索中...")
+            slots = search_slots_or_none(backend, logger, facility_name, date)
+            results.append((facility_name, date, slots))
+            if on_result is not None:
+                on_result(facility_name, date, slots)
+    finally:
+        backend.quit()
+    return results
+
+
+def run_availability_pool(logger, tasks, max_workers, on_result=None):
+    """
+    (施設名, 日付) のリストを複数のセッションで並列に検索する。
+    on_result(施設名, 日付, 結果) を渡すと、1件の検索が終わるたびに各セッションのスレッドから呼び出す。
+    戻り値は {施設名: {日付: SlotAvailability のリスト（エラーの場合は None）}} の辞書。
+    """
+    workers = max(1, min(max_workers, MAX_WORKERS_LIMIT, len(tasks)))
+    if workers < max_workers:
+        logger.info(f"同時セッション数を{workers}に制限します")
+
+    chunks = split_tasks(tasks, workers)
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fun_navi") as executor:
+        futures = [executor.submit(_search_worker, logger, chunk, on_result) for chunk in chunks]
+        for future in futures:
+            for facility_name, date, slots in future.result():
+                results.setdefault(facility_name, {})[date] = slots
+    return results
@@ -0,0 +1,108 @@
+from dataclasses import dataclass, field
+
+# 日付欄（YYYY/MM/DD）の入力文字数
+DATE_KEYSTROKES = 10
+
+
+@dataclass
+class Query:
+    """1回の検索（キーワード・日付）と、その結果から分かる施設"""
+    keyword: str
+    date: str
+    facility_names: list = field(default_factory=list)
+
+
+def keyword_for(facility_name, shared_keywords):
+    """施設名を含む共通キーワードがあればそれを、なければ施設名そのものを検索キーワードにする"""
+    for keyword in shared_keywords:
+        if keyword and keyword in facility_name:
+            return keyword
+    return facility_name
+
+
+def count_cost(queries):
+    """前回と異なる欄のみ入力し直す前提で、検索回数・欄の入力回数・入力文字数を数える"""
+    last_keyword, last_date = None, None
+    field_edits = keystrokes = 0
+    for query in queries:
+        if query.keyword != last_keyword:
+            field_edits += 1
+            keystrokes += len(query.keyword)
+            last_keyword = query.keyword
+        if query.date != last_date:
+            field_edits += 1
+            keystrokes += DATE_KEYSTROKES
+            last_date = query.date
+    return {"searches": len(queries), "field_edits": field_edits, "keystrokes": keystrokes}
+
+
+def baseline_queries(pairs):
+    """従来の順序（日付ごとに全施設を1件ずつ検索）"""
+    return [Query(facility_name, date, [facility_name]) for facility_name, date in pairs]
+
+
+def plan_queries(pairs, shared_keywords=()):
+    """
+    (施設名, 日付) のリストから、検索回数と入力し直しが最小になる検索の順序を作る。
+    同じ共通キーワードで検索できる施設は1回の検索にまとめ、
+    キーワード優先・日付優先それぞれで折り返し順（境界で同じ値が続く）を比べて少ない方を選ぶ。
+    """
+    groups = {}
+    keywords = []
+    for facility_name, date in pairs:
+        keyword = keyword_for(facility_name, shared_keywords)
+        if keyword not in keywords:
+            keywords.append(keyword)
+        facility_names = groups.setdefault((keyword, date), [])
+        if facility_name not in facility_names:
+            facility_names.append(facility_name)
+    dates = sorted({date for _, date in groups})
+
+    # キーワード優先（キーワードごとに日付を往復）
+    keyword_major = []
+    for i, keyword in enumerate(keywords):
+        keyword_dates = [date for date in dates if (keyword, date) in groups]
+        for date in (reversed(keyword_dates) if i % 2 else keyword_dates):
+            keyword_major.append(Query(keyword, date, groups[(keyword, date)]))
+
+    # 日付優先（日付ごとにキーワードを往復）
+    date_major = []
+    for i, date in enumerate(dates):
+        date_keywords = [keyword for keyword in keywords if (keyword, date) in groups]
+        for keyword in (reversed(date_keywords) if i % 2 else date_keywords):
+            date_major.append(Query(keyword, date, groups[(keyword, date)]))
+
+    return min(keyword_major, date_major, key=lambda queries: (count_cost(queries)["keystrokes"], len(queries)))
+
+
+def plan_savings(pairs, queries):
+    """従来の順序と比べて削減できた検索回数・入力文字数"""
+    baseline = count_cost(baseline_queries(pairs))
+    planned = count_cost(queries)
+    return {
+        "baseline": baseline,
+        "planned": planned,
+        "searches_saved": baseline["searches"] - planned["searches"],
+        "field_edits_saved": baseline["field_edits"] - planned["field_edits"],
+        "keystrokes_saved": baseline["keystrokes"] - planned["keystrokes"],
+    }
+
+
+def split_slots(query, slots):
+    """
+    1回の検索結果を施設ごとに分ける。
+    時間帯のない施設は空きなし（[]）とし、ボタンはあるのにどの施設の見出しにも当てはまらない場合のみ、
+    空きなしと区別するため全施設を None（検索失敗）にする。
+    """
+    if slots is None:
+        return {facility_name: None for facility_name in query.facility_names}
+    if query.facility_names == [query.keyword]:
+        return {query.keyword: slots}
+
+    results = {
+        facility_name: [slot for slot in slots if slot.facility_name and facility_name in slot.facility_name]
+        for facility_name in query.facility_names
+    }
+    if slots and not any(results.values()):
+        return {facility_name: None for facility_name in query.facility_names}
+    return results
@@ -0,0 +1,147 @@
+from fun_navi_common import (
+    configure_logging, initialize_driver, login, apply_for_facility_lottery, with_relogin,
+    get_dates_range, get_lottery_period, new_form_state, fill_search_form
+)
+from fun_navi_pool import split_tasks
+from fun_navi_wait import wait_for
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+import csv
+import os
+import time
+
+logger = configure_logging()
+
+# 環境変数を読み込み
+FACILITY_NAMES = [name.strip() for name in os.getenv("PRR_FACILITY_NAMES", "").split(",") if name.strip()]
+START_AT = os.getenv("PRR_START_AT")
+SESSIONS = max(1, int(os.getenv("PRR_SESSIONS", "2")))
+WARMUP_SECONDS = float(os.getenv("PRR_WARMUP_SECONDS", "120"))
+REPORT_FILE = "lottery_timing_report.csv"
+REPORT_FIELDS = [
+    "session", "facility_name", "date", "status", "reservation_number",
+    "started_at", "searched_at", "sent_at", "confirmed_at", "sent_offset_ms", "confirmed_offset_ms",
+]
+
+
+def wait_until(target):
+    """指定時刻（time.time()の値）まで待機。直前は短い間隔で待ち、開始の遅れを小さくする"""
+    while True:
+        remaining = target - time.time()
+        if remaining <= 0:
+            return
+        time.sleep(remaining - 0.05 if remaining > 0.1 else 0.001)
+
+
+def format_time(timestamp):
+    if timestamp is None:
+        return ""
+    return datetime.fromtimestamp(timestamp).isoformat(timespec="milliseconds")
+
+
+def offset_ms(timestamp, start):
+    if timestamp is None:
+        return ""
+    return round((timestamp - start) * 1000)
+
+
+def report_row(session_no, facility_name, date, reservation_data, timings, start):
+    return {
+        "session": session_no,
+        "facility_name": facility_name,
+        "date": date,
+        "status": reservation_data["status"],
+        "reservation_number": reservation_data["reservation_number"],
+        "started_at": format_time(timings.get("started_at")),
+        "searched_at": format_time(timings.get("searched_at")),
+        "sent_at": format_time(timings.get("sent_at")),
+        "confirmed_at": format_time(timings.get("confirmed_at")),
+        "sent_offset_ms": offset_ms(timings.get("sent_at"), start),
+        "confirmed_offset_ms": offset_ms(timings.get("confirmed_at"), start),
+    }
+
+
+def run_session(session_no, chunk, start):
+    """
+    ログインと検索フォームの入力を済ませて開始時刻まで待ち、割り当てられた申し込みを順に行う。
+    エラーになった申し込みも Failed として記録し、完了した申し込みの結果を失わないよう必ず全件の結果を返す。
+    """
+    report = []
+    driver = None
+    try:
+        driver = initialize_driver()
+        form_state = new_form_state()
+        login(driver, logger)
+
+        # 最初の申し込み対象を入力しておき、開始時刻には検索ボタンを押すだけにする
+        wait_for(driver, "scheduled_lottery_form", EC.presence_of_element_located((By.ID, "keyword")), 10)
+        first_facility_name, first_date = chunk[0]
+        fill_search_form(driver, first_facility_name, datetime.strptime(first_date, "%Y/%m/%d"), form_state)
+    except Exception as e:
+        logger.error(f"セッション{session_no}: 申し込みの準備中にエラーが発生しました: {e}")
+        if driver is not None:
+            driver.quit()
+        return [report_row(session_no, facility_name, date, {"status": f"Failed: {e}", "reservation_number": ""}, {}, start)
+                for facility_name, date in chunk]
+
+    try:
+        logger.info(f"セッション{session_no}: 準備が完了しました。{format_time(start)}まで待機します")
+        wait_until(start)
+        for facility_name, date in chunk:
+            timings = {"started_at": time.time()}
+            try:
+                reservation_data = with_relogin(
+                    driver, logger, apply_for_facility_lottery, facility_name, date,
+                    form_state=form_state, timings=timings,
+                )
+            except Exception as e:
+                # 再ログイン後のセッション切れなど。残りの申し込みは続ける
+                logger.error(f"セッション{session_no}: 施設: {facility_name}, 日付: {date} の申し込み中にエラーが発生しました: {e}")
+                reservation_data = {"status": f"Failed: {e}", "reservation_number": ""}
+            report.append(report_row(session_no, facility_name, date, reservation_data, timings, start))
+    finally:
+        driver.quit()
+    return report
+
+
+if not FACILITY_NAMES:
+    raise ValueError("PRR_FACILITY_NAMESが空です。環境変数に少なくとも1つの施設名を指定してください。")
+if not START_AT:
+    raise ValueError("PRR_START_ATが空です。申し込み開始時刻を YYYY/MM/DD HH:MM:SS 形式で指定してください。")
+
+start_at = datetime.strptime(START_AT, "%Y/%m/%d %H:%M:%S")
+start = start_at.timestamp()
+
+# 申し込み対象は開始時刻の2ヶ月後の月
+start_date, end_date = get_lottery_period(start_at)
+dates = get_dates_range(start_date, end_date, "PRR")
+tasks = [(facility_name, date) for date in dates for facility_name in FACILITY_NAMES]
+chunks = split_tasks(tasks, min(SESSIONS, len(tasks)))
+logger.info(f"{len(tasks)}件の申し込みを{len(chunks)}セッションで{START_AT}に開始します")
+
+# ブラウザの起動とログインは開始時刻の PRR_WARMUP_SECONDS 秒前から
+wait_until(start - WARMUP_SECONDS)
+
+report = []
+try:
+    with ThreadPoolExecutor(max_workers=len(chunks), thread_name_prefix="fun_navi") as executor:
+        futures = [executor.submit(run_session, session_no, chunk, start) for session_no, chunk in enumerate(chunks, 1)]
+        for future in futures:
+            try:
+                report.extend(future.result())
+            except Exception as e:
+                logger.error(f"申し込み中にエラーが発生しました: {e}")
+
+finally:
+    report.sort(key=lambda row: row["started_at"])
+    with open(REPORT_FILE, "w", encoding="utf-8", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(report)
+
+    sent_offsets = [row["sent_offset_ms"] for row in report if row["sent_offset_ms"] != ""]
+    if sent_offsets:
+        logger.info(f"送信{len(sent_offsets)}件: 開始から最初 {min(sent_offsets)}ms、最後 {max(sent_offsets)}ms")
+    logger.info(f"申し込みのタイミングを{REPORT_FILE}に出力しました")
@@ -0,0 +1,121 @@
+from cryptography.fernet import Fernet, InvalidToken
+from contextlib import contextmanager
+from datetime import datetime
+import json
+import logging
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Windowsではプロセス間の排他制御を行わない
+    fcntl = None
+
+# 複数セッションから同時に保存される場合の排他制御
+_cache_lock = threading.Lock()
+
+
+class SessionExpiredError(Exception):
+    """ログインセッションの有効期限切れ（ログイン画面に戻された）"""
+
+
+# .env の読み込み後に参照できるよう、設定は使用時に取得する
+def _cache_enabled():
+    return os.getenv("SESSION_CACHE", "true").lower() == "true"
+
+
+def _cache_file():
+    return os.getenv("SESSION_CACHE_FILE", ".fun_navi_session")
+
+
+def _key_file():
+    return os.getenv("SESSION_CACHE_KEY_FILE", ".fun_navi_session.key")
+
+
+def _get_fernet():
+    """暗号化キーを取得（環境変数 → キーファイル → 新規作成の順）"""
+    key = os.getenv("SESSION_CACHE_KEY")
+    if not key:
+        if os.path.exists(_key_file()):
+            with open(_key_file(), "rb") as file:
+                key = file.read().strip()
+        else:
+            key = Fernet.generate_key()
+            # 所有者のみ読み書きできる権限で作成
+            fd = os.open(_key_file(), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, "wb") as file:
+                file.write(key)
+    return Fernet(key)
+
+
+def _read_cache():
+    if not os.path.exists(_cache_file()):
+        return {}
+    try:
+        with open(_cache_file(), "rb") as file:
+            return json.loads(_get_fernet().decrypt(file.read()))
+    except (InvalidToken, ValueError) as e:
+        logging.warning(f"セッションキャッシュを読み込めないため破棄します: {e}")
+        return {}
+
+
+def _write_cache(cache):
+    token = _get_fernet().encrypt(json.dumps(cache, ensure_ascii=False).encode("utf-8"))
+    tmp_file = _cache_file() + ".tmp"
+    fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as file:
+        file.write(token)
+    os.replace(tmp_file, _cache_file())
+
+
+@contextmanager
+def _locked_cache():
+    """スレッド間・プロセス間（複数アカウントの並列実行）でキャッシュの読み書きを排他制御する"""
+    with _cache_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(_cache_file() + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def load_session(user_id):
+    """保存済みのセッション（cookieとログイン後のURL）を取得"""
+    if not _cache_enabled():
+        return None
+    with _locked_cache():
+        return _read_cache().get(user_id or "")
+
+
+def save_session(user_id, cookies, landing_url):
+    """ログイン成功後のcookieを暗号化して保存"""
+    if not _cache_enabled():
+        return
+    with _locked_cache():
+        cache = _read_cache()
+        cache[user_id or ""] = {
+            "cookies": cookies,
+            "landing_url": landing_url,
+            "saved_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        _write_cache(cache)
+
+
+def clear_session(user_id):
+    """期限切れのセッションを削除"""
+    if not _cache_enabled():
+        return
+    with _locked_cache():
+        cache = _read_cache()
+        if cache.pop(user_id or "", None) is not None:
+            _write_cache(cache)
+
+
+def get_session_check_url(session):
+    """セッションの有効性確認に使うURL（未指定の場合はログイン後のURL）"""
+    return os.getenv("SESSION_CHECK_URL") or session["landing_url"]
@@ -0,0 +1,171 @@
+"""
+時間帯ごとの空き状況を 施設 × 日付 × 時間帯 の配列（numpy）で保持し、
+「今後60日の土曜夜の空き」のような条件での検索と、列指向形式（Parquet）への出力を行う。
+
+    python3 fun_navi_slot_matrix.py --weekdays 土 --start-from 17:00 --days 60
+    python3 fun_navi_slot_matrix.py --parquet availability_slots.parquet
+"""
+from fun_navi_store import connect_store, DAY_SLOT
+from fun_navi_dates import WEEKDAY_NAMES, parse_weekdays
+from fun_navi_logging import configure_logging
+from datetime import datetime, timedelta
+import argparse
+import re
+import numpy as np
+
+# 状態のコード（未取得は 0）
+UNKNOWN, UNAVAILABLE, AVAILABLE, DRAWING = 0, 1, 2, 3
+STATUS_CODES = {"available": AVAILABLE, "drawing": DRAWING}
+STATUS_NAMES = {UNKNOWN: "unknown", UNAVAILABLE: "unavailable", AVAILABLE: "available", DRAWING: "drawing"}
+
+_TIME = re.compile(r"(\d{1,2}):(\d{2})")
+
+
+def slot_start_minutes(slot):
+    """時間帯の表示（例: 18:00～21:00）から開始時刻（0時からの分）を取り出す（不明な場合は -1）"""
+    match = _TIME.search(slot)
+    return int(match.group(1)) * 60 + int(match.group(2)) if match else -1
+
+
+class SlotMatrix:
+    """
+    施設 × 日付 × 時間帯 の状態コード（uint8）の配列。
+    facilities・slots は軸の並び、dates は numpy の日付（datetime64[D]）の配列。
+    """
+
+    def __init__(self, facilities, dates, slots, status):
+        self.facilities = list(facilities)
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        self.slots = list(slots)
+        self.status = status
+        self.slot_starts = np.array([slot_start_minutes(slot) for slot in self.slots], dtype=np.int16)
+        # 月曜を0とする曜日（1970/01/01は木曜）
+        self.weekdays = (self.dates.astype(np.int64) + 3) % 7
+
+    @classmethod
+    def from_records(cls, records):
+        """(施設名, 日付 YYYY/MM/DD, 時間帯, 状態) の並びから作成"""
+        records = [record for record in records if record[2] != DAY_SLOT]
+        facilities = sorted({record[0] for record in records})
+        dates = sorted({record[1] for record in records})
+        slots = sorted({record[2] for record in records}, key=lambda slot: (slot_start_minutes(slot), slot))
+
+        facility_index = {name: i for i, name in enumerate(facilities)}
+        date_index = {date: i for i, date in enumerate(dates)}
+        slot_index = {slot: i for i, slot in enumerate(slots)}
+        status = np.zeros((len(facilities), len(dates), len(slots)), dtype=np.uint8)
+        for facility_name, date, slot, state in records:
+            status[facility_index[facility_name], date_index[date], slot_index[slot]] = STATUS_CODES.get(state, UNAVAILABLE)
+
+        return cls(facilities, [date.replace("/", "-") for date in dates], slots, status)
+
+    @classmethod
+    def from_store(cls, conn, facility_names=None):
+        """保存済みの時間帯ごとの検索結果から作成"""
+        query = "SELECT facility_name, date, slot, status FROM availability WHERE slot != ?"
+        params = [DAY_SLOT]
+        if facility_names:
+            query += f" AND facility_name IN ({','.join('?' * len(facility_names))})"
+            params += list(facility_names)
+        return cls.from_records(conn.execute(query, params).fetchall())
+
+    @property
+    def available(self):
+        """空きのビットマップ（施設 × 日付 × 時間帯）"""
+        return self.status == AVAILABLE
+
+    def mask(self, start=None, end=None, weekdays=None, start_from=None, start_until=None, facilities=None):
+        """
+        条件に合う 施設 × 日付 × 時間帯 のマスク。
+        start / end は日付（両端を含む）、weekdays は曜日（月曜=0）のリスト、
+        start_from / start_until は時間帯の開始時刻（HH:MM、両端を含む）、facilities は施設名に含まれる文字列のリスト。
+        """
+        date_mask = np.ones(len(self.dates), dtype=bool)
+        if start is not None:
+            date_mask &= self.dates >= np.datetime64(start.strftime("%Y-%m-%d"))
+        if end is not None:
+            date_mask &= self.dates <= np.datetime64(end.strftime("%Y-%m-%d"))
+        if weekdays is not None:
+            date_mask &= np.isin(self.weekdays, list(weekdays))
+
+        slot_mask = np.ones(len(self.slots), dtype=bool)
+        if start_from is not None:
+            slot_mask &= self.slot_starts >= slot_start_minutes(start_from)
+        if start_until is not None:
+            slot_mask &= (self.slot_starts >= 0) & (self.slot_starts <= slot_start_minutes(start_until))
+
+        facility_mask = np.ones(len(self.facilities), dtype=bool)
+        if facilities:
+            facility_mask = np.array([any(keyword in name for keyword in facilities) for name in self.facilities], dtype=bool)
+
+        return facility_mask[:, None, None] & date_mask[None, :, None] & slot_mask[None, None, :]
+
+    def find(self, status=AVAILABLE, **conditions):
+        """条件に合い、状態が status の (施設名, 日付 YYYY/MM/DD, 時間帯) を日付順に返す"""
+        hits = np.argwhere((self.status == status) & self.mask(**conditions))
+        hits = hits[np.lexsort((hits[:, 2], hits[:, 0], hits[:, 1]))] if len(hits) else hits
+        return [
+            (self.facilities[f], self.dates[d].astype(datetime).strftime("%Y/%m/%d"), self.slots[s])
+            for f, d, s in hits
+        ]
+
+    def free_slots_ahead(self, days, now=None, **conditions):
+        """今日から days 日先までの空き時間帯（例: free_slots_ahead(60, weekdays=[5], start_from="17:00")）"""
+        now = now or datetime.now()
+        return self.find(AVAILABLE, start=now, end=now + timedelta(days=days), **conditions)
+
+    def to_parquet(self, path):
+        """
+        取得済みのセルを 施設名・日付・時間帯・状態 の列でParquetに出力する。
+        pyarrowが必要なため、使用時のみimportする。
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        f, d, s = np.nonzero(self.status != UNKNOWN)
+        codes = self.status[f, d, s]
+        table = pa.table({
+            "facility_name": pa.DictionaryArray.from_arrays(pa.array(f.astype(np.int32)), pa.array(self.facilities)),
+            "date": pa.array(self.dates[d]),
+            "weekday": pa.array(self.weekdays[d].astype(np.int8)),
+            "slot": pa.DictionaryArray.from_arrays(pa.array(s.astype(np.int32)), pa.array(self.slots)),
+            "slot_start_minutes": pa.array(self.slot_starts[s]),
+            "status": pa.DictionaryArray.from_arrays(
+                pa.array(codes.astype(np.int8)), pa.array([STATUS_NAMES[code] for code in sorted(STATUS_NAMES)])),
+            "available": pa.array(codes == AVAILABLE),
+        })
+        pq.write_table(table, path, compression="zstd")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="時間帯ごとの空き状況の検索・出力")
+    parser.add_argument("--days", type=int, default=60, help="今日から何日先までを対象にするか")
+    parser.add_argument("--weekdays", help="曜日（例: 土,日）")
+    parser.add_argument("--start-from", help="時間帯の開始時刻の下限（例: 17:00）")
+    parser.add_argument("--start-until", help="時間帯の開始時刻の上限（例: 12:00）")
+    parser.add_argument("--facility", action="append", help="施設名に含まれる文字列（複数指定可）")
+    parser.add_argument("--parquet", help="全ての結果をParquetで出力するファイル")
+    args = parser.parse_args()
+
+    # FUN_NAVI_DB・LOG_LEVEL などを .env で指定している場合に備えて読み込む
+    from dotenv import load_dotenv
+    load_dotenv(override=True)
+    logger = configure_logging()
+
+    store = connect_store()
+    matrix = SlotMatrix.from_store(store)
+    store.close()
+
+    if args.parquet:
+        matrix.to_parquet(args.parquet)
+        logger.info(f"{args.parquet}に出力しました")
+
+    for facility_name, date, slot in matrix.free_slots_ahead(
+        args.days,
+        weekdays=parse_weekdays(args.weekdays) if args.weekdays else None,
+        start_from=args.start_from,
+        start_until=args.start_until,
+        facilities=args.facility,
+    ):
+        logger.info(f"{date}({WEEKDAY_NAMES[datetime.strptime(date, '%Y/%m/%d').weekday()]}) {slot} {facility_name}",
+                    extra={"facility": facility_name, "date": date, "slot": slot, "outcome": "available"})
@@ -0,0 +1,212 @@
+from fun_navi_parser import parse_datetime_with_weekday
+from datetime import datetime, timedelta
+import os
+import sqlite3
+
+
+# .env の読み込み後に参照できるよう、設定は使用時に取得する
+def _store_file():
+    return os.getenv("FUN_NAVI_DB", "fun_navi.db")
+
+
+# 日単位のまとめ（いずれかの時間帯が空いているか）を記録する slot の値
+DAY_SLOT = ""
+
+# 予約履歴から消えた（取り消し・削除された）予約のステータス
+REMOVED_STATUS = "Removed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS availability (
+    facility_name TEXT NOT NULL,
+    date TEXT NOT NULL,
+    slot TEXT NOT NULL,
+    status TEXT NOT NULL,
+    fetched_at TEXT NOT NULL,
+    PRIMARY KEY (facility_name, date, slot)
+);
+CREATE TABLE IF NOT EXISTS availability_history (
+    facility_name TEXT NOT NULL,
+    date TEXT NOT NULL,
+    slot TEXT NOT NULL,
+    status TEXT NOT NULL,
+    observed_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS availability_history_key
+    ON availability_history (facility_name, date, slot, observed_at);
+CREATE TABLE IF NOT EXISTS reservations (
+    reservation_number TEXT PRIMARY KEY,
+    facility_name TEXT NOT NULL,
+    start_time TEXT NOT NULL,
+    end_time TEXT NOT NULL,
+    start_at TEXT,
+    status TEXT NOT NULL,
+    first_seen_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reservation_changes (
+    reservation_number TEXT NOT NULL,
+    old_status TEXT,
+    new_status TEXT NOT NULL,
+    changed_at TEXT NOT NULL
+);
+"""
+
+
+def connect_store(path=None):
+    """結果保存用のSQLiteに接続（テーブルがなければ作成）"""
+    conn = sqlite3.connect(path or _store_file())
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _to_date(date):
+    if isinstance(date, str):
+        return datetime.strptime(date, "%Y/%m/%d")
+    return date
+
+
+def cache_ttl(date, now):
+    """利用日までの日数に応じたキャッシュの有効期間（利用日が近いほど短くする）"""
+    days_ahead = (_to_date(date).date() - now.date()).days
+    if days_ahead <= int(os.getenv("PR_CACHE_NEAR_DAYS", "14")):
+        return timedelta(minutes=float(os.getenv("PR_CACHE_NEAR_TTL_MINUTES", "10")))
+    return timedelta(minutes=float(os.getenv("PR_CACHE_TTL_MINUTES", "360")))
+
+
+def is_fresh(conn, facility_name, date, now):
+    """有効期間内の検索結果が保存済みかどうか（PR_CACHE_TTL_MINUTES が0以下の場合は常に False）"""
+    if float(os.getenv("PR_CACHE_TTL_MINUTES", "360")) <= 0:
+        return False
+    date_str = _to_date(date).strftime("%Y/%m/%d")
+    row = conn.execute(
+        "SELECT fetched_at FROM availability WHERE facility_name = ? AND date = ? AND slot = ?",
+        (facility_name, date_str, DAY_SLOT),
+    ).fetchone()
+    if row is None:
+        return False
+    # 過去の日付は予約できないため再検索しない
+    if _to_date(date).date() < now.date():
+        return True
+    return now - datetime.fromisoformat(row[0]) < cache_ttl(date, now)
+
+
+def save_availability(conn, facility_name, date, slots, fetched_at=None):
+    """
+    検索結果（SlotAvailability のリスト）を保存する。
+    状態が変わった時間帯は履歴にも記録する。
+    """
+    fetched_at = (fetched_at or datetime.now()).isoformat(timespec="seconds")
+    date_str = _to_date(date).strftime("%Y/%m/%d")
+
+    statuses = {slot.slot: slot.status for slot in slots}
+    statuses[DAY_SLOT] = "available" if any(slot.available for slot in slots) else "unavailable"
+
+    previous = dict(conn.execute(
+        "SELECT slot, status FROM availability WHERE facility_name = ? AND date = ?",
+        (facility_name, date_str),
+    ).fetchall())
+
+    with conn:
+        # 検索結果から消えた時間帯を残さないよう、日付ごとに入れ替える
+        conn.execute(
+            "DELETE FROM availability WHERE facility_name = ? AND date = ?",
+            (facility_name, date_str),
+        )
+        conn.executemany(
+            "INSERT INTO availability (facility_name, date, slot, status, fetched_at) VALUES (?, ?, ?, ?, ?)",
+            [(facility_name, date_str, slot, status, fetched_at) for slot, status in statuses.items()],
+        )
+        conn.executemany(
+            "INSERT INTO availability_history (facility_name, date, slot, status, observed_at) VALUES (?, ?, ?, ?, ?)",
+            [(facility_name, date_str, slot, status, fetched_at)
+             for slot, status in statuses.items() if previous.get(slot) != status],
+        )
+
+
+def load_matrix(conn, facility_names, dates):
+    """保存済みの結果から {施設名: {日付: ○/×}} を作成"""
+    matrix = {facility_name: {} for facility_name in facility_names}
+    placeholders = ",".join("?" * len(facility_names))
+    rows = conn.execute(
+        f"SELECT facility_name, date, status FROM availability WHERE slot = ? AND facility_name IN ({placeholders})",
+        [DAY_SLOT] + list(facility_names),
+    )
+    wanted_dates = set(dates)
+    for facility_name, date, status in rows:
+        if date in wanted_dates:
+            matrix[facility_name][date] = "○" if status == "available" else "×"
+    return matrix
+
+
+def load_known_reservations(conn):
+    """保存済みの予約の {予約番号: ステータス}"""
+    return dict(conn.execute("SELECT reservation_number, status FROM reservations").fetchall())
+
+
+def save_reservations(conn, reservations, now=None, complete=False):
+    """
+    取得した予約（CSV出力用の辞書）を保存し、新規・ステータス変更の差分を返す。
+    complete=True（予約履歴を最後のページまで読み込んだ場合）は、保存済みの先日付の予約のうち
+    取得できなかったもの（取り消し・削除された予約）のステータスを REMOVED_STATUS にする。
+    差分は reservation_changes にも記録する。
+    """
+    now = now or datetime.now()
+    known = load_known_reservations(conn)
+    changes = []
+    removed = []
+    if complete:
+        fetched_numbers = {reservation["reservation_number"] for reservation in reservations}
+        removed = [
+            reservation for reservation in load_upcoming_reservations(conn, now)
+            if reservation["reservation_number"] not in fetched_numbers
+        ]
+    now = now.isoformat(timespec="seconds")
+
+    with conn:
+        for reservation in reservations:
+            number = reservation["reservation_number"]
+            old_status = known.get(number)
+            if old_status == reservation["status"]:
+                continue
+
+            start_at = parse_datetime_with_weekday(reservation["start_time"])
+            conn.execute(
+                "INSERT INTO reservations (reservation_number, facility_name, start_time, end_time, start_at, status, first_seen_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (reservation_number) DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at",
+                (number, reservation["facility_name"], reservation["start_time"], reservation["end_time"],
+                 start_at.isoformat() if start_at else None, reservation["status"], now, now),
+            )
+            conn.execute(
+                "INSERT INTO reservation_changes (reservation_number, old_status, new_status, changed_at) VALUES (?, ?, ?, ?)",
+                (number, old_status, reservation["status"], now),
+            )
+            changes.append({**reservation, "old_status": old_status})
+
+        for reservation in removed:
+            number = reservation["reservation_number"]
+            conn.execute(
+                "UPDATE reservations SET status = ?, updated_at = ? WHERE reservation_number = ?",
+                (REMOVED_STATUS, now, number),
+            )
+            conn.execute(
+                "INSERT INTO reservation_changes (reservation_number, old_status, new_status, changed_at) VALUES (?, ?, ?, ?)",
+                (number, reservation["status"], REMOVED_STATUS, now),
+            )
+            changes.append({**reservation, "status": REMOVED_STATUS, "old_status": reservation["status"]})
+    return changes
+
+
+def load_upcoming_reservations(conn, now):
+    """保存済みの先日付の予約（取り消し・削除されたものを除く）をCSV出力用の辞書で返す"""
+    rows = conn.execute(
+        "SELECT facility_name, start_time, end_time, reservation_number, status FROM reservations"
+        " WHERE start_at > ? AND status != ? ORDER BY start_at",
+        (now.isoformat(), REMOVED_STATUS),
+    ).fetchall()
+    return [
+        {"facility_name": facility_name, "start_time": start_time, "end_time": end_time,
+         "reservation_number": reservation_number, "status": status}
+        for facility_name, start_time, end_time, reservation_number, status in rows
+    ]
@@ -0,0 +1,127 @@
+from fun_navi_common import (
+    initialize_driver, login, new_form_state, search_steps, lottery_steps
+)
+from fun_navi_backend import log_search_result
+
+# バックグラウンドのタブでもタイマーや描画が遅くならないようにする
+TAB_ARGUMENTS = [
+    "--disable-background-timer-throttling",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-renderer-backgrounding",
+]
+
+
+def open_tabs(driver, tab_count):
+    """ログイン後のページを tab_count 個のタブで開き、各タブのウィンドウハンドルを返す"""
+    landing_url = driver.current_url
+    handles = [driver.current_window_handle]
+    for _ in range(tab_count - 1):
+        driver.switch_to.new_window("tab")
+        driver.get(landing_url)
+        handles.append(driver.current_window_handle)
+    return handles
+
+
+def run_pipelined(driver, logger, handles, tasks, make_steps, on_result=None):
+    """
+    タスクを各タブに割り当て、ステップ（サーバーへのリクエスト）ごとにタブを切り替えて進める。
+    1つのタブが応答を待っている間に、他のタブのリクエストを先に送る。
+    make_steps(driver, task, form_state) はステップのジェネレータを返す関数。
+    on_result(task, 結果) を渡すと、タスクが終わるたびに呼び出す。
+    戻り値は [(task, 結果)] のリスト（エラーの場合の結果は None）。
+    """
+    pending = iter(tasks)
+    # タブごとのフォーム入力状態
+    form_states = {handle: new_form_state() for handle in handles}
+    active = {}
+    results = []
+
+    def finish(task, result):
+        results.append((task, result))
+        if on_result is not None:
+            on_result(task, result)
+
+    def assign(handle):
+        task = next(pending, None)
+        if task is None:
+            active.pop(handle, None)
+        else:
+            active[handle] = (task, make_steps(driver, task, form_states[handle]))
+
+    for handle in handles:
+        assign(handle)
+
+    while active:
+        for handle in list(active):
+            task, steps = active[handle]
+            driver.switch_to.window(handle)
+            try:
+                next(steps)
+                continue
+            except StopIteration as stop:
+                finish(task, stop.value)
+            except Exception as e:
+                logger.error(f"タブでの処理中にエラーが発生: {task} - {e}")
+                # 入力状態が分からなくなるため、次のタスクでは全て入力し直す
+                form_states[handle].update(new_form_state())
+                finish(task, None)
+            assign(handle)
+
+    return results
+
+
+def run_availability_tabs(logger, tasks, tab_count, on_result=None):
+    """
+    (施設名, 日付) のリストを1つのブラウザの複数タブで検索する。
+    on_result(施設名, 日付, 結果) を渡すと、1件の検索が終わるたびに呼び出す。
+    戻り値は {施設名: {日付: SlotAvailability のリスト（エラーの場合は None）}} の辞書。
+    """
+    driver = initialize_driver(TAB_ARGUMENTS)
+    try:
+        login(driver, logger)
+        handles = open_tabs(driver, max(1, min(tab_count, len(tasks))))
+
+        def make_steps(driver, task, form_state):
+            facility_name, date = task
+            return search_steps(driver, facility_name, date, form_state)
+
+        def finish(task, slots):
+            facility_name, date = task
+            if slots is not None:
+                log_search_result(logger, facility_name, date, slots)
+            if on_result is not None:
+                on_result(facility_name, date, slots)
+
+        results = {}
+        for (facility_name, date), slots in run_pipelined(driver, logger, handles, tasks, make_steps, finish):
+            results.setdefault(facility_name, {})[date] = slots
+        return results
+    finally:
+        driver.quit()
+
+
+def run_lottery_tabs(driver, logger, tasks, tab_count, on_result=None):
+    """
+    ログイン済みのブラウザの複数タブで (施設名, 日付) のリストを抽選申し込みし、申し込み結果のリストを返す。
+    ブラウザは TAB_ARGUMENTS を指定して起動しておく。
+    on_result(申し込み結果) を渡すと、1件の申し込みが終わるたびに呼び出す。
+    """
+    handles = open_tabs(driver, max(1, min(tab_count, len(tasks))))
+
+    def make_steps(driver, task, form_state):
+        facility_name, date = task
+        return lottery_steps(driver, logger, facility_name, date, form_state, {})
+
+    reservation_results = []
+
+    def finish(task, reservation_data):
+        facility_name, date = task
+        if reservation_data is None:
+            reservation_data = {"facility_name": facility_name, "date": date,
+                                "reservation_number": "", "status": "Failed"}
+        reservation_results.append(reservation_data)
+        if on_result is not None:
+            on_result(reservation_data)
+
+    run_pipelined(driver, logger, handles, tasks, make_steps, finish)
+    return reservation_results
@@ -0,0 +1,227 @@
+"""
+処理の段階（ブラウザ起動・ログイン・フォーム入力・検索・ローディング待ちなど）ごとの所要時間の計測。
+TRACE_REPORT に出力先（拡張子なし）を指定した場合のみ記録し、実行終了時に次の3ファイルを出力する。
+
+- <TRACE_REPORT>.json        段階ごとの集計（件数・合計・パーセンタイル・ヒストグラム）と遅かった呼び出し
+- <TRACE_REPORT>.txt         同じ内容の表
+- <TRACE_REPORT>.trace.json  Chrome Trace Event形式（chrome://tracing や Perfetto で表示）
+
+監視・常駐サービスのように長時間動かしてもメモリが増え続けないよう、呼び出しごとの記録は残さず、
+段階ごとの集計・直近の所要時間（パーセンタイル用）・遅かった呼び出し・直近 TRACE_MAX_EVENTS 件のトレースのみを保持する。
+"""
+from collections import deque
+from contextlib import contextmanager
+import atexit
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+
+# ヒストグラムの区切り（ミリ秒）
+HISTOGRAM_BUCKETS_MS = [10, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+SLOWEST_LIMIT = 20
+# パーセンタイルの計算に使う、段階ごとの直近の所要時間の件数
+STAGE_SAMPLES = 1000
+
+_stages = {}
+_slowest = []
+_events = None
+_window = [None, None]
+_sequence = 0
+_spans_lock = threading.Lock()
+_origin = time.perf_counter()
+_atexit_registered = False
+_logger = logging.getLogger("fun_navi.trace")
+
+
+def trace_enabled():
+    return bool(os.getenv("TRACE_REPORT"))
+
+
+def _histogram_index(duration_ms):
+    return next((i for i, bound in enumerate(HISTOGRAM_BUCKETS_MS) if duration_ms < bound), len(HISTOGRAM_BUCKETS_MS))
+
+
+def _record(record):
+    global _atexit_registered, _events, _sequence
+    duration_ms = record["duration"] * 1000
+    with _spans_lock:
+        stats = _stages.get(record["stage"])
+        if stats is None:
+            stats = _stages[record["stage"]] = {
+                "count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0,
+                "histogram": [0] * (len(HISTOGRAM_BUCKETS_MS) + 1), "recent": deque(maxlen=STAGE_SAMPLES),
+            }
+        stats["count"] += 1
+        stats["errors"] += record["outcome"] != "ok"
+        stats["total_ms"] += duration_ms
+        stats["max_ms"] = max(stats["max_ms"], duration_ms)
+        stats["histogram"][_histogram_index(duration_ms)] += 1
+        stats["recent"].append(duration_ms)
+
+        # 遅かった呼び出しは上位 SLOWEST_LIMIT 件のみ残す（同じ所要時間の場合は記録順）
+        _sequence += 1
+        entry = (record["duration"], -_sequence, record)
+        if len(_slowest) < SLOWEST_LIMIT:
+            heapq.heappush(_slowest, entry)
+        elif entry > _slowest[0]:
+            heapq.heapreplace(_slowest, entry)
+
+        if _events is None:
+            _events = deque(maxlen=int(os.getenv("TRACE_MAX_EVENTS", "10000")))
+        _events.append(record)
+
+        end = record["start"] + record["duration"]
+        _window[0] = record["start"] if _window[0] is None else min(_window[0], record["start"])
+        _window[1] = end if _window[1] is None else max(_window[1], end)
+        if not _atexit_registered:
+            atexit.register(write_trace_report)
+            _atexit_registered = True
+
+
+@contextmanager
+def span(stage, **attributes):
+    """
+    with内の所要時間を stage として記録する。
+    例外で抜けた場合は、例外の種類（TimeoutException など）を outcome に記録する。
+    LOG_LEVEL=DEBUG の場合は、stage・duration_ms・outcome を項目に持つログも出力する。
+    """
+    tracing = trace_enabled()
+    if not tracing and not _logger.isEnabledFor(logging.DEBUG):
+        yield
+        return
+
+    outcome = "ok"
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        outcome = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        attributes = {key: str(value) for key, value in attributes.items() if value is not None}
+        if tracing:
+            _record({
+                "stage": stage,
+                "start": started - _origin,
+                "duration": duration,
+                "outcome": outcome,
+                "thread": threading.get_ident(),
+                "attributes": attributes,
+            })
+        _logger.debug(f"{stage}: {duration * 1000:.1f}ms（{outcome}）",
+                      extra=dict(attributes, stage=stage, duration_ms=round(duration * 1000, 1), outcome=outcome))
+
+
+def reset_trace():
+    global _events
+    with _spans_lock:
+        _stages.clear()
+        _slowest.clear()
+        _events = None
+        _window[:] = [None, None]
+
+
+def _percentile(ordered, ratio):
+    return ordered[min(len(ordered) - 1, max(0, round(ratio * len(ordered)) - 1))]
+
+
+def _histogram(counts):
+    labels = [f"<{bound}ms" for bound in HISTOGRAM_BUCKETS_MS] + [f">={HISTOGRAM_BUCKETS_MS[-1]}ms"]
+    return dict(zip(labels, counts))
+
+
+def build_trace_report():
+    """段階ごとの集計（p50・p95 は直近 STAGE_SAMPLES 件から計算）と遅かった呼び出し"""
+    with _spans_lock:
+        stages = {stage: dict(stats, recent=sorted(stats["recent"])) for stage, stats in _stages.items()}
+        slowest = [record for _, _, record in sorted(_slowest, reverse=True)]
+        window = list(_window)
+
+    summary = []
+    for stage, stats in stages.items():
+        summary.append({
+            "stage": stage,
+            "count": stats["count"],
+            "errors": stats["errors"],
+            "total_ms": stats["total_ms"],
+            "mean_ms": stats["total_ms"] / stats["count"],
+            "p50_ms": _percentile(stats["recent"], 0.5),
+            "p95_ms": _percentile(stats["recent"], 0.95),
+            "max_ms": stats["max_ms"],
+            "histogram": _histogram(stats["histogram"]),
+        })
+    # 合計時間の長い段階から並べる
+    summary.sort(key=lambda row: row["total_ms"], reverse=True)
+
+    return {
+        "wall_ms": (window[1] - window[0]) * 1000 if window[0] is not None else 0,
+        "stages": summary,
+        "slowest": [
+            {"stage": record["stage"], "duration_ms": record["duration"] * 1000,
+             "outcome": record["outcome"], "attributes": record["attributes"]}
+            for record in slowest
+        ],
+    }
+
+
+def format_trace_report(report):
+    """集計結果を表形式の文字列にする"""
+    header = f"{'stage':<24}{'count':>7}{'errors':>7}{'total(ms)':>12}{'mean':>9}{'p50':>9}{'p95':>9}{'max':>9}"
+    lines = [f"計測期間: {report['wall_ms']:.0f}ms", "", header, "-" * len(header)]
+    for row in report["stages"]:
+        lines.append(
+            f"{row['stage']:<24}{row['count']:>7}{row['errors']:>7}{row['total_ms']:>12.0f}"
+            f"{row['mean_ms']:>9.0f}{row['p50_ms']:>9.0f}{row['p95_ms']:>9.0f}{row['max_ms']:>9.0f}"
+        )
+
+    lines += ["", "ヒストグラム（件数）"]
+    for row in report["stages"]:
+        buckets = ", ".join(f"{label}: {count}" for label, count in row["histogram"].items() if count)
+        lines.append(f"  {row['stage']:<22}{buckets}")
+
+    lines += ["", f"遅かった呼び出し（上位{SLOWEST_LIMIT}件）"]
+    for record in report["slowest"]:
+        attributes = " ".join(f"{key}={value}" for key, value in record["attributes"].items())
+        lines.append(f"  {record['duration_ms']:>9.0f}ms  {record['stage']:<22}{record['outcome']:<18}{attributes}")
+    return "\n".join(lines)
+
+
+def export_trace_events(path):
+    """直近 TRACE_MAX_EVENTS 件の呼び出しを Chrome Trace Event形式（完了イベント "X"）で出力する"""
+    with _spans_lock:
+        spans = list(_events or ())
+    pid = os.getpid()
+    events = [
+        {
+            "name": record["stage"],
+            "cat": "fun_navi",
+            "ph": "X",
+            "ts": record["start"] * 1_000_000,
+            "dur": record["duration"] * 1_000_000,
+            "pid": pid,
+            "tid": record["thread"],
+            "args": dict(record["attributes"], outcome=record["outcome"]),
+        }
+        for record in spans
+    ]
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file, ensure_ascii=False)
+
+
+def write_trace_report(prefix=None):
+    """集計結果（JSON・表）とトレースを出力する（TRACE_REPORT 未指定または記録なしの場合は何もしない）"""
+    prefix = prefix or os.getenv("TRACE_REPORT")
+    if not prefix or not _stages:
+        return
+
+    report = build_trace_report()
+    with open(f"{prefix}.json", "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    with open(f"{prefix}.txt", "w", encoding="utf-8") as file:
+        file.write(format_trace_report(report) + "\n")
+    export_trace_events(f"{prefix}.trace.json")
+    logging.getLogger(__name__).info(f"処理時間の計測結果を{prefix}.json, {prefix}.txt, {prefix}.trace.json に出力しました")
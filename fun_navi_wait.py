@@ -0,0 +1,98 @@
+"""
+WebDriverWait の待ち時間の調整。
+待ち時間の上限を固定値ではなく、これまでに観測した応答時間（待ちの種類ごと）から決め、
+複数の結果（抽選ボタン・抽選待ち・空きなし など）を同時に待って最初に当てはまったものを返す。
+key は待機する箇所ごとに分ける（応答時間の異なる待ちを混ぜると、待ち時間の上限が短くなりすぎるため）。
+"""
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+from collections import deque
+import os
+import threading
+import time
+
+# 応答時間の観測値を保持する件数と、待ち時間の計算に使い始める件数
+HISTORY_SIZE = 50
+MIN_SAMPLES = 5
+
+_observed = {}
+_observed_lock = threading.Lock()
+
+
+def poll_interval():
+    """条件を確認する間隔（秒、Seleniumの既定値は0.5秒）"""
+    return float(os.getenv("WAIT_POLL_INTERVAL", "0.1"))
+
+
+def record_duration(key, seconds):
+    with _observed_lock:
+        _observed.setdefault(key, deque(maxlen=HISTORY_SIZE)).append(seconds)
+
+
+def adaptive_timeout(key, default):
+    """
+    観測した応答時間のp95に係数を掛けた値（観測した最大値より短くはしない）を待ち時間の上限にする
+    （WAIT_TIMEOUT_MIN〜WAIT_TIMEOUT_MAX の範囲）。観測数が少ないうちは default を使う。
+    """
+    if os.getenv("WAIT_ADAPTIVE", "true").lower() != "true":
+        return default
+    with _observed_lock:
+        samples = sorted(_observed.get(key, ()))
+    if len(samples) < MIN_SAMPLES:
+        return default
+
+    p95 = samples[min(len(samples) - 1, round(0.95 * len(samples)) - 1)]
+    factor = float(os.getenv("WAIT_TIMEOUT_FACTOR", "3"))
+    minimum = float(os.getenv("WAIT_TIMEOUT_MIN", "2"))
+    maximum = float(os.getenv("WAIT_TIMEOUT_MAX", "30"))
+    return min(maximum, max(minimum, p95 * factor, samples[-1]))
+
+
+def _check(condition, driver):
+    """条件を1回だけ確認する（要素がない・古くなった場合は満たしていない扱い）"""
+    try:
+        return condition(driver)
+    except (NoSuchElementException, StaleElementReferenceException):
+        return False
+
+
+def _wait(driver, key, condition, timeout):
+    """
+    条件を満たすまで待機し、応答時間を記録する。
+    待つ前から満たしている場合は記録しない（応答時間ではないため）。タイムアウトした場合は待ち時間の上限を記録する。
+    """
+    result = _check(condition, driver)
+    if result:
+        return result
+    started = time.monotonic()
+    try:
+        result = WebDriverWait(driver, timeout, poll_frequency=poll_interval()).until(condition)
+    except TimeoutException:
+        record_duration(key, timeout)
+        raise
+    record_duration(key, time.monotonic() - started)
+    return result
+
+
+def wait_for(driver, key, condition, default_timeout):
+    """条件を満たすまで待機し、条件の戻り値を返す（key ごとに応答時間を記録して待ち時間を調整）"""
+    return _wait(driver, key, condition, adaptive_timeout(key, default_timeout))
+
+
+def wait_for_any(driver, key, outcomes, default_timeout):
+    """
+    outcomes（{結果名: 条件}）のいずれかを満たすまで待機し、(結果名, 条件の戻り値) を返す。
+    同時に満たす場合は outcomes の先に書いたものを優先する。どれも満たさない場合は TimeoutException。
+    """
+    def any_outcome(driver):
+        for name, condition in outcomes.items():
+            value = _check(condition, driver)
+            if value:
+                return name, value
+        return False
+
+    timeout = adaptive_timeout(key, default_timeout)
+    try:
+        return _wait(driver, key, any_outcome, timeout)
+    except TimeoutException:
+        raise TimeoutException(f"{timeout:.1f}秒以内に {', '.join(outcomes)} のいずれも確認できませんでした")
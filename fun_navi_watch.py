@@ -0,0 +1,123 @@
+from fun_navi_common import configure_logging
+from fun_navi_dates import split_by_day_off
+from fun_navi_backend import search_slots_or_none
+from fun_navi_engine import create_resilient_backend
+from fun_navi_store import connect_store, save_availability
+from datetime import datetime
+import json
+import os
+import statistics
+import sys
+import time
+import urllib.request
+
+logger = configure_logging()
+
+# 環境変数を読み込み
+FACILITY_NAMES = [name.strip() for name in os.getenv("PR_FACILITY_NAMES", "").split(",") if name.strip()]
+DAYS_AHEAD = int(os.getenv("PW_DAYS_AHEAD", "60"))
+HOLIDAYS_ONLY = os.getenv("PW_HOLIDAYS_ONLY", "false").lower() == "true"
+POLL_INTERVAL = float(os.getenv("PW_POLL_INTERVAL_SECONDS", "60"))
+LOW_PRIORITY_EVERY = max(1, int(os.getenv("PW_LOW_PRIORITY_EVERY", "5")))
+EVENT_OUTPUTS = [output.strip() for output in os.getenv("PW_EVENT_OUTPUT", "stdout").split(",") if output.strip()]
+
+
+def get_watch_dates(today):
+    """今日から PW_DAYS_AHEAD 日先までの日付を、土日祝日（優先）とそれ以外に分けて返す"""
+    high_priority, low_priority = split_by_day_off(today, DAYS_AHEAD)
+    return high_priority, [] if HOLIDAYS_ONLY else low_priority
+
+
+def emit_event(event):
+    """空きの検出をイベントとして出力（stdout / file:パス / webhook:URL）"""
+    line = json.dumps(event, ensure_ascii=False)
+    for output in EVENT_OUTPUTS:
+        try:
+            if output == "stdout":
+                sys.stdout.write(line + "\n")
+                sys.stdout.flush()
+            elif output.startswith("file:"):
+                with open(output[len("file:"):], "a", encoding="utf-8") as file:
+                    file.write(line + "\n")
+            elif output.startswith("webhook:"):
+                request = urllib.request.Request(
+                    output[len("webhook:"):], data=line.encode("utf-8"),
+                    headers={"Content-Type": "application/json"}, method="POST",
+                )
+                urllib.request.urlopen(request, timeout=3).close()
+            else:
+                logger.warning(f"不明なイベント出力先です: {output}")
+        except Exception as e:
+            logger.error(f"イベントの出力に失敗しました（{output}）: {e}")
+
+
+def diff_slots(facility_name, date, slots, state, observed_at, cycle):
+    """
+    前回の状態と比較し、×から○に変わった時間帯のイベントを返す。
+    空きが出た時刻は前回×を確認した時刻と今回の間のため、その差を検出遅延の上限とする。
+    """
+    events = []
+    for slot in slots:
+        key = (facility_name, date, slot.slot)
+        previous = state.get(key)
+        if slot.available and previous is not None and not previous["available"]:
+            latency = (observed_at - previous["observed_at"]).total_seconds()
+            events.append({
+                "event": "slot_opened",
+                "facility_name": facility_name,
+                "date": date,
+                "slot": slot.slot,
+                "detected_at": observed_at.isoformat(timespec="seconds"),
+                "last_unavailable_at": previous["observed_at"].isoformat(timespec="seconds"),
+                "detection_latency_max_sec": round(latency, 1),
+                "detection_latency_est_sec": round(latency / 2, 1),
+                "cycle": cycle,
+            })
+        state[key] = {"available": slot.available, "observed_at": observed_at}
+    return events
+
+
+# 長時間の監視でもブラウザが止まらないよう、再試行と定期的な再起動を行う
+backend = create_resilient_backend(logger)
+store = connect_store()
+state = {}
+latencies = []
+
+try:
+    # ログインしたセッションを使い続ける
+    backend.login()
+
+    cycle = 0
+    while True:
+        cycle_started = time.monotonic()
+        high_priority, low_priority = get_watch_dates(datetime.now())
+        # 土日祝日は毎回、それ以外は PW_LOW_PRIORITY_EVERY 回に1回確認
+        dates = high_priority + (low_priority if cycle % LOW_PRIORITY_EVERY == 0 else [])
+
+        for date in dates:
+            for facility_name in FACILITY_NAMES:
+                slots = search_slots_or_none(backend, logger, facility_name, date)
+                if slots is None:
+                    continue
+                observed_at = datetime.now()
+                save_availability(store, facility_name, date, slots, observed_at)
+                for event in diff_slots(facility_name, date, slots, state, observed_at, cycle):
+                    latencies.append(event["detection_latency_max_sec"])
+                    emit_event(event)
+
+        elapsed = time.monotonic() - cycle_started
+        message = f"監視サイクル{cycle}: {len(dates) * len(FACILITY_NAMES)}件を{elapsed:.1f}秒で確認"
+        if latencies:
+            message += (f", 検出遅延の上限 p50={statistics.median(latencies):.1f}秒"
+                        f" max={max(latencies):.1f}秒（{len(latencies)}件）")
+        logger.info(message)
+
+        cycle += 1
+        time.sleep(max(0, POLL_INTERVAL - elapsed))
+
+except KeyboardInterrupt:
+    logger.info("監視を終了します")
+
+finally:
+    backend.quit()
+    store.close()
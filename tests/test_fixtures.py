@@ -0,0 +1,60 @@
+"""
+記録済みのページ（fixtures）での解析処理の確認。リポジトリのルートで実行する。
+
+    python3 -m unittest discover -s tests
+"""
+from fun_navi_fixtures import check_fixtures, golden_path, iter_fixtures
+from fun_navi_parser import parse_datetime_with_weekday
+from datetime import datetime
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures")
+
+
+class CheckFixturesTest(unittest.TestCase):
+
+    def test_fixtures_match_goldens(self):
+        self.assertTrue(list(iter_fixtures(FIXTURE_DIR)))
+        self.assertEqual(check_fixtures(FIXTURE_DIR), 0)
+
+    def test_empty_directory_fails(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertEqual(check_fixtures(directory), 1)
+        self.assertEqual(check_fixtures(os.path.join(FIXTURE_DIR, "missing")), 1)
+
+    def test_mismatch_and_missing_golden_fail(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for path, _ in iter_fixtures(FIXTURE_DIR):
+                shutil.copy(path, directory)
+                shutil.copy(golden_path(path), directory)
+            paths = [path for path, _ in iter_fixtures(directory)]
+
+            with open(golden_path(paths[0]), encoding="utf-8") as file:
+                expected = json.load(file)
+            expected["kind"] = "other" if expected["kind"] != "other" else "login"
+            with open(golden_path(paths[0]), "w", encoding="utf-8") as file:
+                json.dump(expected, file)
+            os.remove(golden_path(paths[1]))
+
+            self.assertEqual(check_fixtures(directory), 2)
+
+
+class ParseDatetimeWithWeekdayTest(unittest.TestCase):
+
+    def test_valid(self):
+        self.assertEqual(parse_datetime_with_weekday("2025/04/26(土) 18:00"), datetime(2025, 4, 26, 18, 0))
+        self.assertEqual(parse_datetime_with_weekday("2025/01/05(日) 09:30"), datetime(2025, 1, 5, 9, 30))
+
+    def test_invalid_date_returns_none(self):
+        with self.assertLogs(level="ERROR"):
+            self.assertIsNone(parse_datetime_with_weekday("2025/02/30(日) 10:00"))
+        with self.assertLogs(level="ERROR"):
+            self.assertIsNone(parse_datetime_with_weekday("2025/04/26(土) 25:00"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+検索順序の最適化（fun_navi_query_planner）の確認。リポジトリのルートで実行する。
+
+    python3 -m unittest discover -s tests
+"""
+from fun_navi_parser import SlotAvailability
+from fun_navi_query_planner import Query, plan_queries, plan_savings, split_slots
+import unittest
+
+OCEAN_DAY = "SEA／E棟1階_PARTY ROOM OCEAN_昼"
+OCEAN_NIGHT = "SEA／E棟1階_PARTY ROOM OCEAN_夜"
+SKY_DAY = "SEA／E棟17階_PARTY ROOM SKY_昼"
+
+
+class SplitSlotsTest(unittest.TestCase):
+
+    def test_single_facility(self):
+        query = Query(OCEAN_DAY, "2025/05/01", [OCEAN_DAY])
+        slots = [SlotAvailability(OCEAN_DAY, "09:00～12:00", "available")]
+        self.assertEqual(split_slots(query, slots), {OCEAN_DAY: slots})
+        self.assertEqual(split_slots(query, []), {OCEAN_DAY: []})
+
+    def test_shared_keyword(self):
+        query = Query("OCEAN", "2025/05/01", [OCEAN_DAY, OCEAN_NIGHT])
+        day = SlotAvailability(OCEAN_DAY, "09:00～12:00", "available")
+        night = SlotAvailability(OCEAN_NIGHT, "18:00～21:00", "unavailable")
+        self.assertEqual(split_slots(query, [day, night]), {OCEAN_DAY: [day], OCEAN_NIGHT: [night]})
+        # 片方の施設のみ時間帯がある場合、もう片方は空きなし
+        self.assertEqual(split_slots(query, [day]), {OCEAN_DAY: [day], OCEAN_NIGHT: []})
+        # 時間帯が1つもないページは、単独の検索と同じく空きなし
+        self.assertEqual(split_slots(query, []), {OCEAN_DAY: [], OCEAN_NIGHT: []})
+
+    def test_no_heading_matched(self):
+        query = Query("OCEAN", "2025/05/01", [OCEAN_DAY, OCEAN_NIGHT])
+        slots = [SlotAvailability("", "09:00～12:00", "available"), SlotAvailability(SKY_DAY, "09:00～12:00", "available")]
+        self.assertEqual(split_slots(query, slots), {OCEAN_DAY: None, OCEAN_NIGHT: None})
+
+    def test_failed_search(self):
+        query = Query("OCEAN", "2025/05/01", [OCEAN_DAY, OCEAN_NIGHT])
+        self.assertEqual(split_slots(query, None), {OCEAN_DAY: None, OCEAN_NIGHT: None})
+
+
+class PlanQueriesTest(unittest.TestCase):
+
+    def test_shared_keyword_merges_facilities(self):
+        pairs = [(facility_name, date) for date in ("2025/05/01", "2025/05/02")
+                 for facility_name in (OCEAN_DAY, OCEAN_NIGHT, SKY_DAY)]
+        queries = plan_queries(pairs, ["OCEAN"])
+
+        self.assertEqual(len(queries), 4)
+        covered = sorted((facility_name, query.date) for query in queries for facility_name in query.facility_names)
+        self.assertEqual(covered, sorted(pairs))
+        for query in queries:
+            if query.keyword == "OCEAN":
+                self.assertEqual(query.facility_names, [OCEAN_DAY, OCEAN_NIGHT])
+            else:
+                self.assertEqual(query.facility_names, [query.keyword])
+
+        savings = plan_savings(pairs, queries)
+        self.assertEqual(savings["searches_saved"], 2)
+        self.assertGreater(savings["keystrokes_saved"], 0)
+
+    def test_without_shared_keywords(self):
+        pairs = [(OCEAN_DAY, "2025/05/01"), (SKY_DAY, "2025/05/01"), (OCEAN_DAY, "2025/05/02")]
+        queries = plan_queries(pairs)
+        self.assertEqual(sorted((query.keyword, query.date) for query in queries), sorted(pairs))
+
+
+if __name__ == "__main__":
+    unittest.main()